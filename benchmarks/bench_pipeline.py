@@ -0,0 +1,146 @@
+"""
+Micro-benchmark of the per-request overhead added by the base classes
+
+Calls on_request and on_{method} directly, the same way responder does,
+with minimal request/response stand-ins so only the base class work
+(and encoding the response body) is timed.
+
+    python benchmarks/bench_pipeline.py
+"""
+
+import asyncio
+import base64
+import inspect
+import json
+import os
+import sys
+import time
+from typing import Any, Callable, Dict
+
+# benchmark the checkout this script is in, without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from responder_base_classes.auth_base_service import AuthService
+from responder_base_classes.models import User
+from responder_base_classes.open_base_service import OpenService
+
+ITERATIONS = 20000
+REPEAT = 5
+
+
+class FakeStarletteRequest(object):
+    def __init__(self) -> None:
+        self.scope: Dict[str, Any] = {"type": "http"}
+
+
+class FakeRequest(object):
+    def __init__(self, headers: Dict[str, str]) -> None:
+        self.headers = headers
+        self._starlette = FakeStarletteRequest()
+
+
+class FakeResponse(object):
+    def __init__(self) -> None:
+        self.content: Any = None
+        self.mimetype: Any = None
+        self.media: Any = None
+        self.status_code: Any = None
+        self.headers: Dict[str, str] = {}
+        self._stream: Any = None
+
+    def body(self) -> bytes:
+        # pre-encoded content wins, as in responder.models.Response.body
+        if self.content is not None:
+            return self.content  # type: ignore
+        return json.dumps(self.media).encode("utf-8")
+
+
+class BenchOpenService(OpenService):
+    @staticmethod
+    async def execute_on_get(req: Any, resp: Any) -> None:
+        resp.status_code = 200
+
+
+class BenchAuthService(AuthService):
+    user = User(username="test_user", password="test_password")
+
+    def get_user(self, req: Any) -> User:
+        return self.user
+
+    def valid_credentials_for_route(self, req: Any, user: User) -> bool:
+        return True
+
+    @staticmethod
+    async def execute_on_get(req: Any, resp: Any) -> None:
+        resp.status_code = 200
+
+
+class BenchInlineAuthService(BenchAuthService):
+    # the pre thread pool behavior, get_user called on the event loop
+    get_user_workers = 0
+
+
+async def _await_fully(result: Any) -> None:
+    # older decorator stacks could hand back un-awaited coroutines
+    while inspect.isawaitable(result):
+        result = await result
+
+
+async def _run(service_class: Callable, headers: Dict[str, str]) -> float:
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        service = service_class()
+        req = FakeRequest(dict(headers))
+        resp = FakeResponse()
+        await _await_fully(service.on_request(req, resp))
+        await _await_fully(service.on_get(req, resp))
+        resp.body()
+    return (time.perf_counter() - start) / ITERATIONS * 1e6
+
+
+def main() -> None:
+    encoded = base64.b64encode(b"test_user:test_password").decode("utf-8")
+    cases = [
+        ("OpenService", BenchOpenService, {"content-type": "application/json"}),
+        (
+            "AuthService (custom headers)",
+            BenchAuthService,
+            {
+                "content-type": "application/json",
+                "username": "test_user",
+                "password": "test_password",
+            },
+        ),
+        (
+            "AuthService (get_user_workers=0)",
+            BenchInlineAuthService,
+            {
+                "content-type": "application/json",
+                "username": "test_user",
+                "password": "test_password",
+            },
+        ),
+        (
+            "AuthService (basic auth)",
+            BenchAuthService,
+            {"content-type": "application/json", "authorization": f"Basic {encoded}"},
+        ),
+        ("OpenService (415)", BenchOpenService, {"content-type": "application/xml"}),
+        (
+            "AuthService (400)",
+            BenchAuthService,
+            {"content-type": "application/json", "authorization": "Basic !"},
+        ),
+    ]
+
+    loop = asyncio.new_event_loop()
+    for name, service_class, headers in cases:
+        microseconds = min(
+            loop.run_until_complete(_run(service_class, headers)) for _ in range(REPEAT)
+        )
+        print(f"{name:<32} {microseconds:8.2f} us/request")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,13 @@ __author__ = "icleary"
 
 import responder
 
-from .decorators import valid_content_type, valid_credential_format, valid_credentials
+from .decorators import (
+    bounded_body,
+    rate_limited,
+    valid_content_type,
+    valid_credential_format,
+    valid_credentials,
+)
 from .models import AuthServiceInterface
 from .open_base_service import OpenService
 
@@ -22,7 +28,9 @@ class AuthService(OpenService, AuthServiceInterface):
     def __init__(self) -> None:
         super().__init__()
 
+    @rate_limited
     @valid_content_type
+    @bounded_body
     @valid_credential_format
     @valid_credentials
     async def on_request(
@@ -36,8 +44,8 @@ class AuthService(OpenService, AuthServiceInterface):
         """
 
         # valid content type, execute on_request method
-        execute_function_name = "execute_on_request"
-        if hasattr(self, execute_function_name):
-            await getattr(self, execute_function_name)(req, resp)
+        handler = self._execute_handlers.get("on_request")
+        if handler is not None:
+            await handler(self, req, resp)
 
         return
@@ -0,0 +1,90 @@
+__author__ = "icleary"
+
+import asyncio
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+
+class BatchLoader(object):
+    """
+    DataLoader style batching, concurrent load(key) calls are collected and
+    resolved by a single load_many(keys) call
+        - a batch is dispatched on the next event loop tick (max_wait=0),
+          after max_wait seconds, or as soon as it holds max_batch_size keys
+        - duplicate keys within a batch are loaded once
+        - keys missing from load_many's result resolve to None
+    Not thread safe, meant to be used from the event loop
+    """
+
+    def __init__(
+        self,
+        load_many: Callable[[List[Hashable]], Awaitable[Mapping[Hashable, Any]]],
+        max_batch_size: int = 100,
+        max_wait: float = 0.0,
+    ) -> None:
+        self.load_many = load_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.batches = 0
+        self._pending: List[Tuple[Hashable, "asyncio.Future[Any]"]] = []
+        self._handle: Optional[asyncio.Handle] = None
+
+    async def load(self, key: Hashable) -> Any:
+        """
+        :param key: key to load, batched with concurrent calls
+        :return: value load_many returned for key, or None
+        """
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((key, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._dispatch()
+        elif self._handle is None:
+            if self.max_wait > 0:
+                self._handle = loop.call_later(self.max_wait, self._dispatch)
+            else:
+                self._handle = loop.call_soon(self._dispatch)
+
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._load_batch(batch))
+
+    async def _load_batch(
+        self, batch: Sequence[Tuple[Hashable, "asyncio.Future[Any]"]]
+    ) -> None:
+        # unique keys, in the order they were requested
+        keys = list(dict.fromkeys(key for key, _future in batch))
+        self.batches += 1
+
+        try:
+            values = await self.load_many(keys)
+        except asyncio.CancelledError:
+            for _key, future in batch:
+                future.cancel()
+            raise
+        except Exception as error:
+            for _key, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for key, future in batch:
+            if not future.done():
+                future.set_result(values.get(key))
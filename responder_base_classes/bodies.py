@@ -0,0 +1,100 @@
+__author__ = "icleary"
+
+from typing import Any, AsyncIterator, Callable, Optional
+
+import responder
+
+from .encoders import JSON
+
+PAYLOAD_TOO_LARGE = "request body is too large"
+INVALID_CONTENT_LENGTH = "content-length is invalid"
+
+
+class RequestBodyTooLarge(ValueError):
+    """Raised while reading a request body past the class's max_body_size"""
+
+
+def content_length(req: responder.models.Request) -> Optional[int]:
+    """
+    :param req: Mutable request object
+    :return: declared size of the request body, or None if it isn't declared
+    :raises ValueError: if the content-length header isn't a non negative integer
+    """
+    value = req.headers.get("content-length")
+    if value is None:
+        return None
+
+    length = int(value)
+    if length < 0:
+        raise ValueError(value)
+    return length
+
+
+async def iter_body(
+    req: responder.models.Request, max_body_size: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """
+    Read a request body chunk by chunk, as the client sends it, instead of
+    buffering all of it like req.content and req.media() do
+    :param req: Mutable request object
+    :param max_body_size: bytes allowed, None for no limit
+    :return: chunks of the body
+    :raises RequestBodyTooLarge: once more than max_body_size bytes were sent
+    """
+    received = 0
+    async for chunk in req._starlette.stream():
+        if not chunk:
+            continue
+        received += len(chunk)
+        if max_body_size is not None and received > max_body_size:
+            raise RequestBodyTooLarge(max_body_size)
+        yield chunk
+
+
+async def read_body(
+    req: responder.models.Request, max_body_size: Optional[int] = None
+) -> bytes:
+    """
+    :param req: Mutable request object
+    :param max_body_size: bytes allowed, None for no limit
+    :return: the whole body
+    :raises RequestBodyTooLarge: if more than max_body_size bytes were sent
+    """
+    body = b"".join([chunk async for chunk in iter_body(req, max_body_size)])
+    # the stream is consumed, keep the body for req.content and req.media()
+    req._starlette._body = body
+    return body
+
+
+async def iter_records(
+    req: responder.models.Request,
+    max_body_size: Optional[int] = None,
+    decode: Callable[[bytes], Any] = JSON.decode,
+) -> AsyncIterator[Any]:
+    """
+    Parse a newline delimited JSON (NDJSON) body record by record, so bulk
+    uploads are ingested with memory bounded by the largest record
+        - blank lines are skipped
+    :param req: Mutable request object
+    :param max_body_size: bytes allowed, None for no limit
+    :param decode: parses one line
+    :return: records of the body
+    :raises RequestBodyTooLarge: once more than max_body_size bytes were sent
+    :raises ValueError: for a line decode can't parse
+    """
+    buffer = bytearray()
+    async for chunk in iter_body(req, max_body_size):
+        buffer += chunk
+        start = 0
+        end = buffer.find(b"\n")
+        while end != -1:
+            line = bytes(buffer[start:end]).strip()
+            if line:
+                yield decode(line)
+            start = end + 1
+            end = buffer.find(b"\n", start)
+        del buffer[:start]
+
+    line = bytes(buffer).strip()
+    if line:
+        yield decode(line)
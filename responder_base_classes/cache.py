@@ -0,0 +1,248 @@
+__author__ = "icleary"
+
+import hashlib
+import hmac
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+# returned by TTLCache._lookup for missing or expired keys
+MISSING = object()
+
+
+class TTLCache(object):
+    """
+    Bounded in-memory cache
+        - every entry expires ttl seconds after it was set
+        - the least recently used entry is evicted once maxsize is reached
+        - hits and misses are counted for monitoring
+    Not thread safe, meant to be used from the event loop
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: int = 1024,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        # key -> (expires_at, value), ordered from least to most recently used
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _lookup(self, key: Hashable) -> Any:
+        """
+        Uncounted lookup, expired entries are removed
+        :param key: cache key
+        :return: cached value or MISSING
+        """
+        entry = self._data.get(key)
+
+        if entry is None:
+            return MISSING
+
+        expires_at, value = entry
+        if expires_at <= self.timer():
+            del self._data[key]
+            return MISSING
+
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        :param key: cache key
+        :param default: returned if the key is missing or expired
+        :return: cached value
+        """
+        value = self._lookup(key)
+
+        if value is MISSING:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        :param key: cache key
+        :param value: value to cache
+        :param ttl: overrides the cache's ttl for this entry
+        :return:
+        """
+        expires_at = self.timer() + (self.ttl if ttl is None else ttl)
+
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove an entry, whether or not it expired
+        :param key: cache key
+        :param default: returned if the key is missing
+        :return: removed value
+        """
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class CredentialCache(TTLCache):
+    """
+    Successful credential verifications, so repeated requests with the same
+    credentials skip get_user and the password check
+        - keyed by a keyed hash of username and password, plaintext is never stored
+        - set as a class attribute on an AuthService to opt in, e.g.
+            credential_cache = CredentialCache(ttl=60, maxsize=1024)
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60,
+        maxsize: int = 1024,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(ttl, maxsize, timer)
+        # per process secret, hashes can't be precomputed or reused elsewhere
+        self._secret = os.urandom(32)
+
+    def key(self, username: str, password: str) -> bytes:
+        """
+        :param username: username from the request
+        :param password: password from the request
+        :return: digest identifying the credentials
+        """
+        credentials = f"{username}\0{password}".encode("utf-8")
+        return hmac.new(self._secret, credentials, hashlib.sha256).digest()
+
+    def lookup(self, username: str, password: str) -> Any:
+        """
+        :param username: username from the request
+        :param password: password from the request
+        :return: user verified with these credentials, or None
+        """
+        entry = self.get(self.key(username, password))
+        return None if entry is None else entry[1]
+
+    def store(self, username: str, password: str, user: Any) -> None:
+        """
+        Remember a successful verification
+        :param username: username from the request
+        :param password: password from the request
+        :param user: user returned by get_user
+        :return:
+        """
+        self.set(self.key(username, password), (username, user))
+
+    def invalidate(self, username: str, password: Optional[str] = None) -> None:
+        """
+        Forget verifications, e.g. after a password change or revoking a user
+        :param username: username to forget
+        :param password: only forget this password, otherwise every entry of username
+        :return:
+        """
+        if password is not None:
+            self.pop(self.key(username, password))
+            return
+
+        keys = [
+            key
+            for key, (_expires_at, (cached_username, _user)) in self._data.items()
+            if cached_username == username
+        ]
+        for key in keys:
+            del self._data[key]
+
+
+class NegativeCredentialCache(CredentialCache):
+    """
+    Recent failed verifications, so retries (e.g. credential stuffing bursts)
+    are rejected without calling get_user again
+        - unknown users are keyed by username, wrong passwords by username and password
+        - keep the ttl short, a newly created user is rejected until it expires
+        - failures counts every rejection of an entry, to find repeat offenders
+        - set as a class attribute on an AuthService to opt in, e.g.
+            negative_credential_cache = NegativeCredentialCache(ttl=5, maxsize=4096)
+    """
+
+    def __init__(
+        self,
+        ttl: float = 5,
+        maxsize: int = 4096,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(ttl, maxsize, timer)
+
+    def user_key(self, username: str) -> bytes:
+        """
+        :param username: username from the request
+        :return: digest identifying the username
+        """
+        return hmac.new(
+            self._secret, b"\1" + username.encode("utf-8"), hashlib.sha256
+        ).digest()
+
+    def _entry(self, username: str, password: str) -> Optional[List]:
+        for key in (self.user_key(username), self.key(username, password)):
+            value = self._lookup(key)
+            if value is not MISSING:
+                entry: List = value[1]
+                return entry
+        return None
+
+    def lookup(self, username: str, password: str) -> Optional[str]:
+        """
+        Counts a failure if these credentials failed recently
+        :param username: username from the request
+        :param password: password from the request
+        :return: reason the credentials failed, or None
+        """
+        entry = self._entry(username, password)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry[1] += 1
+        reason: str = entry[0]
+        return reason
+
+    def store_unknown_user(self, username: str, reason: str) -> None:
+        """
+        :param username: username get_user didn't find
+        :param reason: reason to reject the username with
+        :return:
+        """
+        self.set(self.user_key(username), (username, [reason, 1]))
+
+    def store_wrong_password(self, username: str, password: str, reason: str) -> None:
+        """
+        :param username: username from the request
+        :param password: password that didn't match
+        :param reason: reason to reject the credentials with
+        :return:
+        """
+        self.set(self.key(username, password), (username, [reason, 1]))
+
+    def failures(self, username: str, password: str = "") -> int:
+        """
+        :param username: username from the request
+        :param password: password from the request, if not an unknown user
+        :return: number of times these credentials failed within the ttl
+        """
+        entry = self._entry(username, password)
+        return 0 if entry is None else int(entry[1])
@@ -0,0 +1,128 @@
+__author__ = "icleary"
+
+import time
+from collections import deque
+from typing import Callable, Deque, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend while its circuit breaker is open"""
+
+
+class CircuitBreaker(object):
+    """
+    Stops calling a degraded backend, e.g. the user store behind get_user
+        - closed: calls go through, the outcome of the last window_size calls
+          is tracked, failures and calls slower than slow_call_duration count
+          against the backend
+        - open: once at least minimum_calls were tracked and failure_threshold of
+          them failed, calls are rejected right away for reset_timeout seconds
+        - half open: then up to half_open_calls probe calls go through,
+          closing the circuit if they all succeed and opening it again if one fails
+    Not thread safe, meant to be used from the event loop
+    """
+
+    def __init__(
+        self,
+        failure_threshold: float = 0.5,
+        slow_call_duration: Optional[float] = None,
+        window_size: int = 20,
+        minimum_calls: int = 10,
+        reset_timeout: float = 30,
+        half_open_calls: int = 1,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.slow_call_duration = slow_call_duration
+        self.window_size = window_size
+        self.minimum_calls = minimum_calls
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self.timer = timer
+        self.state = CLOSED
+        self.rejected = 0
+        # outcomes of the last window_size calls, True for a failure
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+
+    @property
+    def failure_rate(self) -> float:
+        """
+        :return: share of the tracked calls that failed or were slow
+        """
+        return self._failures / len(self._outcomes) if self._outcomes else 0.0
+
+    def allow(self) -> bool:
+        """
+        Call before calling the backend, record() the outcome if allowed
+        :return: True if the call may go through
+        """
+        if self.state == CLOSED:
+            return True
+
+        if self.state == OPEN:
+            if self.timer() < self._opened_at + self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = HALF_OPEN
+            self._probes = 0
+            self._probe_successes = 0
+
+        if self._probes >= self.half_open_calls:
+            self.rejected += 1
+            return False
+
+        self._probes += 1
+        return True
+
+    def record(self, succeeded: bool, duration: float = 0.0) -> None:
+        """
+        Record the outcome of an allowed call
+        :param succeeded: False if the call raised, e.g. timed out
+        :param duration: seconds the call took
+        :return:
+        """
+        failed = not succeeded or (
+            self.slow_call_duration is not None and duration >= self.slow_call_duration
+        )
+
+        if self.state == HALF_OPEN:
+            if failed:
+                self._open()
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_calls:
+                self._close()
+            return
+
+        if self.state == OPEN:
+            # a call allowed before the circuit opened
+            return
+
+        outcomes = self._outcomes
+        if len(outcomes) == outcomes.maxlen and outcomes[0]:
+            self._failures -= 1
+        outcomes.append(failed)
+        self._failures += failed
+
+        if (
+            len(outcomes) >= self.minimum_calls
+            and self.failure_rate >= self.failure_threshold
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self.state = OPEN
+        self._opened_at = self.timer()
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self._outcomes.clear()
+        self._failures = 0
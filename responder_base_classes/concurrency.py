@@ -0,0 +1,77 @@
+__author__ = "icleary"
+
+import asyncio
+from collections import deque
+from typing import Any, Deque, Optional
+
+
+class ConcurrencyLimiter(object):
+    """
+    Bounds the requests running at once, to shed load instead of queueing it unbounded
+        - up to max_in_flight requests run at once
+        - up to max_queued more wait (first in, first out) for up to queue_timeout
+          seconds, None waits until a slot is free
+        - anything beyond that is rejected right away
+        - queue_depth, in_flight and rejected are exposed for monitoring
+    Not thread safe, meant to be used from the event loop
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queued: int = 0,
+        queue_timeout: Optional[float] = None,
+    ) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.rejected = 0
+        # waiters, a released slot is handed to the first one that's still waiting
+        self._waiters: Deque["asyncio.Future[Any]"] = deque()
+
+    async def acquire(self) -> bool:
+        """
+        Take a slot, release() it once the request is done
+        :return: True if a slot was taken, False if the request should be rejected
+        """
+        if self.in_flight < self.max_in_flight and not self.queue_depth:
+            self.in_flight += 1
+            return True
+
+        if self.queue_depth >= self.max_queued:
+            self.rejected += 1
+            return False
+
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append(future)
+        self.queue_depth += 1
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # the slot was handed over as the waiter was cancelled
+                self.release()
+            raise
+        finally:
+            self.queue_depth -= 1
+
+        return True
+
+    def release(self) -> None:
+        """
+        Release a slot taken by acquire(), handing it to the next waiter
+        :return:
+        """
+        waiters = self._waiters
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+
+        self.in_flight -= 1
@@ -0,0 +1,40 @@
+__author__ = "icleary"
+
+import asyncio
+import math
+from typing import Awaitable, Optional, TypeVar
+
+from .state import RequestState
+
+T = TypeVar("T")
+
+DEADLINE_EXCEEDED = "deadline exceeded"
+
+
+def parse_timeout(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a client's timeout header, see Base.timeout_header
+    :param value: header value in seconds, e.g. "2.5"
+    :return: seconds, or None if missing, malformed or not positive
+    """
+    if value is None:
+        return None
+    try:
+        timeout = float(value)
+    except ValueError:
+        return None
+    return timeout if math.isfinite(timeout) and timeout > 0 else None
+
+
+async def within_deadline(state: RequestState, awaitable: Awaitable[T]) -> T:
+    """
+    Await, cancelling the awaitable once the request's deadline has passed
+    :param state: state of the request, see RequestState.start_deadline
+    :param awaitable: e.g. a check or an execute_on_{method} handler
+    :return: result of the awaitable
+    :raises asyncio.TimeoutError: if the deadline passed first
+    """
+    remaining = state.time_remaining()
+    if remaining is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, remaining)
@@ -1,290 +1,829 @@
 # stdlib imports
+import asyncio
+import functools
 import inspect
-from typing import Any, Callable
+import math
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 # package imports
 import responder
-import wrapt
+from pydantic import BaseModel
 
 # local imports
-from .models import AuthServiceInterface, Base
-from .utils import assign_credentials_from_base64, update_reason
+from .bodies import (
+    INVALID_CONTENT_LENGTH,
+    PAYLOAD_TOO_LARGE,
+    RequestBodyTooLarge,
+    content_length,
+    read_body,
+)
+from .circuit import CircuitOpenError
+from .concurrency import ConcurrencyLimiter
+from .deadlines import DEADLINE_EXCEEDED, within_deadline
+from .encoders import JSON, encode_media
+from .idempotency import (
+    IDEMPOTENT_METHODS,
+    IdempotencyStore,
+    idempotency_key,
+    replay_response,
+    store_response,
+)
+from .models import AuthServiceInterface, Base, User
+from .response_cache import (
+    CACHEABLE_METHODS,
+    CachedResponse,
+    render_response,
+    response_key,
+    serve_response,
+)
+from .responses import reject, render_errors, render_failure
+from .state import RequestState, get_request_state
+from .streaming import GuardedStream
+from .tokens import BEARER_PREFIX, SESSION_TOKEN_HEADER
+from .utils import (
+    Credentials,
+    ExecuteHandler,
+    not_implemented_reasons,
+    parse_basic_authorization,
+)
+from .validation import INVALID_BODY, validate_body
+
+R = TypeVar("R")
+
+# renders a response after execute_on_{method}, None if it can't be reused
+Render = Callable[[responder.models.Response], Awaitable[Optional[R]]]
+
+# a single request check, returns False to stop the pipeline
+Check = Callable[
+    [Any, responder.models.Request, responder.models.Response], Awaitable[bool]
+]
+
+RUNTIME_MESSAGE = "Decorator can only be applied to an async method"
+
+USER_DOES_NOT_EXIST = "Invalid credentials for this request, user doesn't exist"
+PASSWORD_IS_WRONG = "Invalid credentials for this request, password is wrong"
+RATE_LIMIT_EXCEEDED = "rate limit exceeded"
+SERVICE_OVERLOADED = "service is overloaded, try again later"
+USER_STORE_UNAVAILABLE = "user store is unavailable, try again later"
+
+
+def validate_placement(func: Any) -> None:
+    """
+    Decorators are validated once, when the class body is evaluated,
+    rather than with inspect checks on every request
+    :param func: object the decorator was applied to
+    :return:
+    """
+    if inspect.isclass(func):
+        # Decorator was applied to a class.
+        raise RuntimeError(RUNTIME_MESSAGE)
+    if isinstance(func, (staticmethod, classmethod)):
+        # Decorator was applied to a staticmethod or classmethod.
+        raise RuntimeError(RUNTIME_MESSAGE)
+    if not inspect.iscoroutinefunction(func):
+        # Decorator was applied to a synchronous function.
+        raise RuntimeError(RUNTIME_MESSAGE)
+
+
+def build_pipeline(func: Callable, checks: Tuple[Check, ...]) -> Callable:
+    """
+    Compile a method and its checks into one flat coroutine
+    1) runs each check in order, stopping at the first failing check
+       and rendering its pre-encoded failure body
+    2) initializes response media and executes func if every check passed
+    3) starts the request's deadline, if the class enforces one, answering 504
+       if the checks and func don't finish in time
+    :param func: undecorated async method (self, req, resp)
+    :param checks: checks to run before func, in order
+    :return: pipeline coroutine function, a drop in replacement for func
+    """
+
+    async def run(
+        self: Base, req: responder.models.Request, resp: responder.models.Response
+    ) -> None:
+        for check in checks:
+            if not await check(self, req, resp):
+                state = get_request_state(req)
+                state.allowed_to_execute_method = False
+                render_failure(req, resp, state.reasons)
+                return
+
+        # assumes failing checks, will override in on_{method}
+        resp.media = {"status": "failure", "reason": None}
+        await func(self, req, resp)
+
+    async def pipeline(
+        self: Base, req: responder.models.Request, resp: responder.models.Response
+    ) -> None:
+        if self._enforces_deadlines:
+            state = get_request_state(req)
+            if state.deadline is None:
+                state.start_deadline(self.request_timeout(req))
+
+            if state.deadline is not None:
+                try:
+                    await within_deadline(state, run(self, req, resp))
+                except asyncio.TimeoutError:
+                    if not state.deadline_exceeded():
+                        raise
+                    state.allowed_to_execute_method = False
+                    deadline_exceeded(req, resp, state, func.__name__)
+                return
+
+        await run(self, req, resp)
+
+    functools.update_wrapper(pipeline, func)
+    pipeline.__pipeline_func__ = func  # type: ignore
+    pipeline.__pipeline_checks__ = checks  # type: ignore
+    return pipeline
+
+
+def add_check(func: Callable, check: Check) -> Callable:
+    """
+    Prepend a check to a (possibly already compiled) pipeline,
+    so stacked decorators run top to bottom
+    :param func: async method or pipeline returned by build_pipeline
+    :param check: check to run first
+    :return: pipeline coroutine function
+    """
+    validate_placement(func)
+
+    checks = getattr(func, "__pipeline_checks__", ())
+    func = getattr(func, "__pipeline_func__", func)
 
+    return build_pipeline(func, (check,) + checks)
 
-@wrapt.decorator
-def valid_content_type(
-    wrapped: Callable, instance: Base, args: str, kwargs: dict
-) -> Any:
+
+async def check_rate_limit(
+    instance: Base, req: responder.models.Request, resp: responder.models.Response
+) -> bool:
     """
-    1) Initializes response media
-    2) Check if headers specify valid content type
-      - executes func if valid content type
+    1) Check the request against each of instance.rate_limits, in order
+      - sets Retry-After, in whole seconds, if a limit is exceeded
+    :param instance: service instance
     :param req: Mutable request object
     :param resp: Mutable response object
+    :return: True if no rate limit is exceeded
     """
+    rate_limits = instance.rate_limits
+    if not rate_limits:
+        return True
 
-    runtime_message = "Decorator can only be applied to a staticmethod"
-
-    if instance is None:
-        if inspect.isclass(wrapped):
-            # Decorator was applied to a class.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to a function or staticmethod.
-            raise RuntimeError(runtime_message)
-    else:
-        if inspect.isclass(instance):
-            # Decorator was applied to a classmethod.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to an staticmethod.
-
-            def _execute(
-                req: responder.models.Request,
-                resp: responder.models.Response,
-                *_args: Any,
-                **_kwargs: Any,
-            ) -> Any:
-                """
-                :param req: Mutable request object
-                :param resp: Mutable response object
-                :param _args: inner args
-                :param _kwargs: inner kwargs
-                :return:
-                """
-                # assumes failing checks, will override in on_{method}
-                resp.media = {"status": "failure", "reason": None}
-
-                # check content type against allowed types
-                if "content-type" in set(req.headers.keys()):
-                    for content_type in instance.allowed_content_types:
-                        if content_type in req.headers["content-type"]:
-                            return wrapped(req, resp, *_args, **_kwargs)
-
-                instance.allowed_to_execute_method = False
-                resp.status_code = 415  # Unsupported media type
-                update_reason(
-                    resp, f"content-type is not in {instance.allowed_content_types}"
-                )
-                return wrapped(req, resp, *_args, **_kwargs)
+    cls = type(instance)
+    scope = f"{cls.__module__}.{cls.__qualname__}"
+    for rate_limit in rate_limits:
+        retry_after = await rate_limit.retry_after(scope, req)
+        if retry_after is not None:
+            resp.headers["Retry-After"] = str(math.ceil(retry_after))
+            return reject(req, resp, 429, RATE_LIMIT_EXCEEDED)  # Too Many Requests
 
-            return _execute(*args, **kwargs)
+    return True
 
 
-@wrapt.decorator
-def execute_on_method_if_allowed_to_execute_method(
-    wrapped: Callable, instance: Base, args: str, kwargs: dict
-) -> Any:
+async def check_content_type(
+    instance: Base, req: responder.models.Request, resp: responder.models.Response
+) -> bool:
     """
-    1) this bootstraps on_{method} checking, since responder calls both on_request and on_{method}
-    2) expects execute_on_{method} to be overloaded, if you want to use that http method
-
+    1) Check if headers specify valid content type
+    :param instance: service instance
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :return: True if valid content type
     """
+    # check content type against allowed types, compiled once per class
+    if instance._content_type_matcher(req.headers.get("content-type")):
+        return True
 
-    runtime_message = "Decorator can only be applied to a staticmethod"
-
-    if instance is None:
-        if inspect.isclass(wrapped):
-            # Decorator was applied to a class.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to a function or staticmethod.
-            raise RuntimeError(runtime_message)
-    else:
-        if inspect.isclass(instance):
-            # Decorator was applied to a classmethod.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to an staticmethod.
-
-            async def _execute(
-                req: responder.models.Request,
-                resp: responder.models.Response,
-                *_args: Any,
-                **_kwargs: Any,
-            ) -> Any:
-                """
-                :param req: Mutable request object
-                :param resp: Mutable response object
-                :param _args: inner args
-                :param _kwargs: inner kwargs
-                :return:
-                """
-                wrapped_function_name = wrapped.__name__
-
-                ###
-                # print(wrapped_function_name)
-                ###
-
-                if not instance.allowed_to_execute_method:
-                    reason_str = f"In {wrapped_function_name} function: exiting before running execute_{wrapped_function_name}_request"
-                    # print(reason_str)
-                    update_reason(resp, reason_str)
-                    return
+    # Unsupported media type
+    return reject(
+        req, resp, 415, f"content-type is not in {instance.allowed_content_types}"
+    )
 
-                execute_function_name = f"execute_{wrapped_function_name}"
 
-                if hasattr(instance, execute_function_name):
-                    await getattr(instance, execute_function_name)(req, resp)
-                else:
-                    resp.media = {
-                        "status": "failure",
-                        "reason": f"{execute_function_name} not implemented for this URL path",
-                    }
-                    resp.status_code = 501  # Not Implemented
+async def check_body_size(
+    instance: Base, req: responder.models.Request, resp: responder.models.Response
+) -> bool:
+    """
+    1) Check the declared size of the request body against instance.max_body_size,
+       before any of it is read
+    :param instance: service instance
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :return: True if the body isn't declared larger than allowed
+    """
+    max_body_size = instance.max_body_size
+    if max_body_size is None:
+        return True
 
-                return wrapped(req, resp, *_args, **_kwargs)
+    try:
+        length = content_length(req)
+    except ValueError:
+        return reject(req, resp, 400, INVALID_CONTENT_LENGTH)  # Bad Request
 
-            return _execute(*args, **kwargs)
+    if length is not None and length > max_body_size:
+        return reject(req, resp, 413, PAYLOAD_TOO_LARGE)  # Payload Too Large
+    return True
 
 
-@wrapt.decorator
-def valid_credential_format(
-    wrapped: Callable, instance: Base, args: str, kwargs: dict
-) -> Any:
+async def check_credential_format(
+    instance: AuthServiceInterface,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+) -> bool:
     """
     1) this checks that credentials are formatted correctly
+      - username and password headers
+      - basic authorization header
+      - bearer authorization header with a session token, if instance.session_tokens
+    :param instance: service instance
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :return: True if credentials are formatted correctly
     """
+    headers = req.headers
+    state = get_request_state(req)
+
+    if "username" in headers and "password" in headers:
+        state.credentials = Credentials(headers["username"], headers["password"])
+        return True
+
+    if "authorization" in headers:
+        authorization = headers["authorization"]
+        session_tokens = instance.session_tokens
+
+        if session_tokens is not None and authorization.startswith(BEARER_PREFIX):
+            # verified here, in process, so check_credentials skips the user store
+            username = session_tokens.verify(authorization[len(BEARER_PREFIX) :])
+            if username is None:
+                return unauthorized(req, resp, "session token is invalid or expired")
+            state.session_username = username
+            return True
+
+        # HTTP basic authentication, parsed headers are memoized
+        credentials = parse_basic_authorization(authorization)
+        if credentials is not None:
+            state.credentials = credentials
+            return True
+
+    # invalid credential format, bad request (can't get credentials)
+    return reject(req, resp, 400, "credential format is invalid")
+
+
+async def check_credentials(
+    instance: AuthServiceInterface,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+) -> bool:
+    """
+    1) this checks that credentials are valid
+      - consults instance.credential_cache and instance.negative_credential_cache,
+        if set, before get_user
+      - rejects with 503 instead of calling get_user while
+        instance.user_store_breaker is open
+      - requests with a session token don't call get_user
+      - issues a session token after a password login authorized for the route,
+        if instance.session_tokens
+    :param instance: service instance
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :return: True if valid credentials for this route
+    """
+    state = get_request_state(req)
 
-    runtime_message = "Decorator can only be applied to a staticmethod"
-
-    if instance is None:
-        if inspect.isclass(wrapped):
-            # Decorator was applied to a class.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to a function or staticmethod.
-            raise RuntimeError(runtime_message)
+    user: Optional[User]
+    if state.session_username is not None:
+        user = instance.user_from_session_token(state.session_username)
     else:
-        if inspect.isclass(instance):
-            # Decorator was applied to a classmethod.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to an staticmethod.
-
-            async def _execute(
-                req: responder.models.Request,
-                resp: responder.models.Response,
-                *_args: Any,
-                **_kwargs: Any,
-            ) -> Any:
-                """
-                :param req: Mutable request object
-                :param resp: Mutable response object
-                :param _args: inner args
-                :param _kwargs: inner kwargs
-                :return:
-                """
-
-                # check credential format
-                header_keys = set(req.headers.keys())
-
-                format_is_username_and_password = (
-                    "username" in header_keys and "password" in header_keys
-                )
-                format_is_base64_authorization = "authorization" in header_keys
+        user = await verify_password_credentials(instance, req, resp)
+        if user is None:
+            return False
+
+    # THIS CAN PROBABLY CHANGE TO A arg or kwarg for the decorator
+    # SOMETHING LIKE WHAT GROUP THEY ARE REQUIRED TO BE IN
+    if not instance.valid_credentials_for_route(req, user):
+        # now check request against user access dict (overridden by each route)
+        return unauthorized(
+            req,
+            resp,
+            "Valid user and password, but invalid authorization for this request",
+        )
+
+    state.user = user
+    if state.session_username is None and instance.session_tokens is not None:
+        resp.headers[SESSION_TOKEN_HEADER] = instance.session_tokens.issue(
+            state.credentials.username  # type: ignore
+        )
+    return True
+
+
+async def verify_password_credentials(
+    instance: AuthServiceInterface,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+) -> Optional[User]:
+    """
+    Verify the username and password found by check_credential_format
+    :param instance: service instance
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :return: user, or None if the credentials were rejected
+    """
+    username, password = get_request_state(req).credentials  # type: ignore
+
+    cache = instance.credential_cache
+    user: Optional[User] = None if cache is None else cache.lookup(username, password)
+
+    if user is not None:
+        return user
+
+    negative_cache = instance.negative_credential_cache
+    if negative_cache is not None:
+        reason = negative_cache.lookup(username, password)
+        if reason is not None:
+            unauthorized(req, resp, reason)
+            return None
+
+    # get user, without blocking the event loop
+    try:
+        user = await instance.lookup_user(req, username)
+    except CircuitOpenError:
+        reject(req, resp, 503, USER_STORE_UNAVAILABLE)  # Service Unavailable
+        return None
+
+    if user is None:
+        if negative_cache is not None:
+            negative_cache.store_unknown_user(username, USER_DOES_NOT_EXIST)
+        unauthorized(req, resp, USER_DOES_NOT_EXIST)
+        return None
+
+    if not await instance.check_password(password, user):
+        if negative_cache is not None:
+            negative_cache.store_wrong_password(username, password, PASSWORD_IS_WRONG)
+        unauthorized(req, resp, PASSWORD_IS_WRONG)
+        return None
+
+    if cache is not None:
+        cache.store(username, password, user)
+    return user
+
+
+def unauthorized(
+    req: responder.models.Request, resp: responder.models.Response, reason: str
+) -> bool:
+    """
+    Fail a credential check
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param reason: why the credentials were rejected
+    :return: False, to stop the pipeline
+    """
+    return reject(req, resp, 401, reason)  # Unauthorized
 
-                if format_is_username_and_password:
-                    ###
-                    # print("format_is_username_and_password")
-                    ###
 
-                    return wrapped(req, resp, *_args, **_kwargs)
-                elif format_is_base64_authorization:
-                    ###
-                    # print("format_is_authorization")
-                    ###
+def rate_limited(func: Callable) -> Callable:
+    """
+    1) Check the request against the class's rate_limits
+      - executes func if no rate limit is exceeded
+    """
+    return add_check(func, check_rate_limit)
 
-                    # placeholder for HTTP basic authentication and base 64
-                    req = assign_credentials_from_base64(req)
-                    return wrapped(req, resp, *_args, **_kwargs)
-                else:
-                    # invalid credential format, update status/reason
 
-                    ###
-                    # print("else, bad credential format")
-                    ###
+def deadline_exceeded(
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+    name: str,
+) -> None:
+    """
+    Answer a request that ran out of time
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :param name: what was running when the deadline passed
+    :return:
+    """
+    reject(req, resp, 504, f"{DEADLINE_EXCEEDED} in {name}")  # Gateway Timeout
+    render_failure(req, resp, state.reasons)
 
-                    instance.allowed_to_execute_method = False
-                    resp.status_code = 400  # bad request (can't get credentials)
-                    update_reason(resp, "credential format is invalid")
 
-                return wrapped(req, resp, *_args, **_kwargs)
+def body_too_large(
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+) -> None:
+    """
+    Answer a request whose body was read past max_body_size
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :return:
+    """
+    reject(req, resp, 413, PAYLOAD_TOO_LARGE)  # Payload Too Large
+    render_failure(req, resp, state.reasons)
 
-            return _execute(*args, **kwargs)
 
+def valid_content_type(func: Callable) -> Callable:
+    """
+    1) Check if headers specify valid content type
+      - executes func if valid content type
+    """
+    return add_check(func, check_content_type)
 
-@wrapt.decorator
-def valid_credentials(
-    wrapped: Callable, instance: AuthServiceInterface, args: str, kwargs: dict
-) -> Any:
+
+def bounded_body(func: Callable) -> Callable:
     """
-    1) this checks that credentials are valid
-    2) expects execute_on_{method} to be overloaded, if you want to use that http method
+    1) Check the request's content-length against the class's max_body_size
+      - executes func if the body isn't declared larger than allowed
+    """
+    return add_check(func, check_body_size)
+
 
+def valid_credential_format(func: Callable) -> Callable:
+    """
+    1) this checks that credentials are formatted correctly
+      - executes func if credentials are formatted correctly
     """
+    return add_check(func, check_credential_format)
 
-    runtime_message = "Decorator can only be applied to a staticmethod"
 
-    if instance is None:
-        if inspect.isclass(wrapped):
-            # Decorator was applied to a class.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to a function or staticmethod.
-            raise RuntimeError(runtime_message)
-    else:
-        if inspect.isclass(instance):
-            # Decorator was applied to a classmethod.
-            raise RuntimeError(runtime_message)
-        else:
-            # Decorator was applied to an staticmethod.
-
-            async def _execute(
-                req: responder.models.Request,
-                resp: responder.models.Response,
-                *_args: Any,
-                **_kwargs: Any,
-            ) -> Any:
-                """
-                :param req: Mutable request object
-                :param resp: Mutable response object
-                :param _args: inner args
-                :param _kwargs: inner kwargs
-                :return:
-                """
-
-                # get user using req headers
-                user = instance.get_user(req)
-
-                if user is None:
-                    instance.allowed_to_execute_method = False
-                    resp.status_code = 401  # Unauthorized
-                    update_reason(
-                        resp, "Invalid credentials for this request, user doesn't exist"
-                    )
-                    # print("user doesn't exist")
-                elif req.headers["password"] != user.password:
-                    instance.allowed_to_execute_method = False
-                    resp.status_code = 401  # Unauthorized
-                    update_reason(
-                        resp, "Invalid credentials for this request, password is wrong"
-                    )
-                    ###
-                    # print("password is wrong")
-                    ###
-
-                # THIS CAN PROBABLY CHANGE TO A arg or kwarg for the decorator
-                # SOMETHING LIKE WHAT GROUP THEY ARE REQUIRED TO BE IN
-                elif not instance.valid_credentials_for_route(req, user):
-                    # now check request against user access dict (overridden by each route)
-                    instance.allowed_to_execute_method = False
-                    resp.status_code = 401  # Unauthorized
-                    update_reason(
-                        resp,
-                        "Valid user and password, but invalid authorization for this request",
+def valid_credentials(func: Callable) -> Callable:
+    """
+    1) this checks that credentials are valid
+      - get_user may be a def (run in a thread pool) or an async def
+      - executes func if get_user finds the user, the password matches
+        and valid_credentials_for_route passes
+    """
+    return add_check(func, check_credentials)
+
+
+def execute_on_method_if_allowed_to_execute_method(func: Callable) -> Callable:
+    """
+    1) this bootstraps on_{method} checking, since responder calls both on_request and on_{method}
+    2) expects execute_on_{method} to be overloaded, if you want to use that http method
+
+    The decorated method only names the http method, its body is not run.
+    """
+    validate_placement(func)
+
+    method = func.__name__
+    reason_str = (
+        f"In {method} function: exiting before running execute_{method}_request"
+    )
+    # any on_{method} may be decorated, e.g. on_options
+    not_implemented = not_implemented_reasons(method)
+
+    async def execute_on_method(
+        self: Base, req: responder.models.Request, resp: responder.models.Response
+    ) -> None:
+        state = get_request_state(req)
+        if not state.allowed_to_execute_method:
+            state.reasons += (reason_str,)
+            render_failure(req, resp, state.reasons)
+            return
+
+        # dispatch table is resolved once per class, see Base
+        handler = self._execute_handlers.get(method)
+
+        # HEAD falls back to execute_on_get, answered with its headers only
+        serves = method
+        if handler is None and method == "on_head":
+            handler = self._execute_handlers.get("on_get")
+            serves = "on_get"
+
+        if handler is None:
+            resp.status_code = 501  # Not Implemented
+            render_failure(req, resp, not_implemented)
+            return
+
+        # request body validation, see Base.post_model
+        model = self._body_models.get(method)
+        if model is not None and not await parse_body(self, model, req, resp, state):
+            return
+
+        head_from_get = serves != method
+        cache = self.response_cache
+        if not head_from_get and (
+            method not in CACHEABLE_METHODS or (cache is None and not self.coalesce_get)
+        ):
+            # replays of requests with an Idempotency-Key, see Base.idempotency_store
+            if self.idempotency_store is not None and method in IDEMPOTENT_METHODS:
+                request_key = req.headers.get(self.idempotency_header)
+                if request_key is not None:
+                    await execute_idempotent(
+                        self, handler, req, resp, state, method, request_key
                     )
+                    return
 
-                return wrapped(req, resp, *_args, **_kwargs)
+            if state.deadline is None and not self._concurrency_limiters:
+                try:
+                    await handler(self, req, resp)
+                except RequestBodyTooLarge:
+                    body_too_large(req, resp, state)
+                    return
+                if self._encoders is not None:
+                    encode_media(self._encoders, req, resp)
+            else:
+                await execute_handler(self, handler, req, resp, state, method)
+            return
+
+        # response caching and coalescing, see Base.response_cache and coalesce_get
+        # a HEAD served by execute_on_get shares the GET responses
+        if cache is None:
+            key = response_key(req, serves, state.user)
+            rendered = None
+        else:
+            key = cache.key(req, serves, state.user)
+            rendered = cache.get(key)
 
-            return _execute(*args, **kwargs)
+        if rendered is None:
+            if self.coalesce_get:
+                rendered = await execute_coalesced(
+                    self, handler, req, resp, state, serves, key, self._get_in_flight
+                )
+            else:
+                rendered = await execute_and_render(
+                    self, handler, req, resp, state, serves
+                )
+            if rendered is None:
+                if head_from_get and resp._stream is not None:
+                    # a streamed GET isn't rendered, HEAD doesn't run its generator
+                    if isinstance(resp._stream, GuardedStream):
+                        resp._stream.release()
+                    resp._stream = None
+                    resp.content = b""
+                return
+            if cache is not None:
+                cache.set(key, rendered)
+
+        serve_response(req, resp, rendered, headers_only=head_from_get)
+
+    functools.update_wrapper(execute_on_method, func)
+    return execute_on_method
+
+
+async def parse_body(
+    instance: Base,
+    model: Type[BaseModel],
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+) -> bool:
+    """
+    Read the request body within max_body_size and validate it with model,
+    decoded by the encoder of its content type (json by default)
+      - the parsed model is kept in state.body
+      - rejects invalid bodies with 422 and their errors, too large ones with 413
+    :param instance: service instance
+    :param model: pydantic model of the body
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :return: True if the body is valid
+    """
+    try:
+        body = await read_body(req, instance.max_body_size)
+    except RequestBodyTooLarge:
+        body_too_large(req, resp, state)
+        return False
+
+    encoder = None
+    if instance._encoders is not None:
+        encoder = instance._encoders.for_content_type(req.headers.get("content-type"))
+
+    state.body, errors = validate_body(model, encoder or JSON, body)
+    if errors:
+        reject(req, resp, 422, INVALID_BODY)  # Unprocessable Entity
+        render_errors(req, resp, state.reasons, errors)
+        return False
+    return True
+
+
+async def execute_and_render(
+    instance: Base,
+    handler: ExecuteHandler,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+    method: str,
+    render: Render = render_response,
+) -> Optional[R]:
+    """
+    Run an execute_on_{method} handler and render its response, without the
+    headers set before it ran
+    :param instance: service instance
+    :param handler: execute_on_{method}
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :param method: responder hook, e.g. "on_get"
+    :param render: renders resp, e.g. response_cache.render_response
+    :return: rendered response, or None if it can't be cached or shared
+    """
+    # only the headers the handler sets are rendered, those of this request's
+    # on_request (e.g. its session token) mustn't be replayed to other requests
+    request_headers = resp.headers
+    resp.headers = {}
+    try:
+        await execute_handler(instance, handler, req, resp, state, method)
+        return await render(resp)
+    finally:
+        request_headers.update(resp.headers)
+        resp.headers = request_headers
+
+
+async def execute_coalesced(
+    instance: Base,
+    handler: ExecuteHandler,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+    method: str,
+    key: Hashable,
+    in_flight: Dict[Hashable, "asyncio.Future[Any]"],
+    render: Render = render_response,
+    serialize_retries: bool = False,
+) -> Optional[R]:
+    """
+    Single flight execute_and_render, the first request with a key runs the
+    handler and identical requests arriving meanwhile share its rendered response
+        - if the response can't be shared (e.g. it failed), they run the handler
+          concurrently, or with serialize_retries one at a time, each retry
+          leading the requests still waiting
+    :param instance: service instance
+    :param handler: execute_on_{method}
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :param method: responder hook, e.g. "on_get"
+    :param key: identifies identical requests, see response_cache.response_key
+    :param in_flight: {key: future of the rendered response} of leaders running
+    :param render: renders resp, e.g. response_cache.render_response
+    :param serialize_retries: never run the handler for a key more than once at a
+        time, e.g. for idempotency keys
+    :return: rendered response, or None if it can't be cached or shared
+    """
+    leader = in_flight.get(key)
+    while leader is not None:
+        try:
+            # a cancelled follower doesn't cancel the leader's response
+            shared = await within_deadline(state, asyncio.shield(leader))
+        except asyncio.TimeoutError:
+            if not state.deadline_exceeded():
+                raise
+            deadline_exceeded(req, resp, state, f"execute_{method}")
+            return None
+        if shared is not None:
+            return shared  # type: ignore
+        if not serialize_retries:
+            return await execute_and_render(
+                instance, handler, req, resp, state, method, render
+            )
+        # the leader's response can't be shared, the first follower to wake up
+        # leads the next attempt and the others wait for it
+        leader = in_flight.get(key)
+
+    future: "asyncio.Future[Any]" = asyncio.get_event_loop().create_future()
+    in_flight[key] = future
+
+    rendered: Optional[R] = None
+    try:
+        rendered = await execute_and_render(
+            instance, handler, req, resp, state, method, render
+        )
+        return rendered
+    finally:
+        del in_flight[key]
+        future.set_result(rendered)
+
+
+async def execute_idempotent(
+    instance: Base,
+    handler: ExecuteHandler,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+    method: str,
+    key: str,
+) -> None:
+    """
+    Run an execute_on_{method} handler at most once per idempotency key
+        - a stored response is replayed instead of running the handler
+        - requests with the key arriving while it runs wait for its response
+    :param instance: service instance
+    :param handler: execute_on_{method}
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :param method: responder hook, e.g. "on_post"
+    :param key: Idempotency-Key header value
+    :return:
+    """
+    store: IdempotencyStore = instance.idempotency_store  # type: ignore
+    store_key = idempotency_key(req, method, key, state.user)
+
+    stored = await store.get(store_key)
+    if stored is None:
+        stored = await execute_coalesced(
+            instance,
+            handler,
+            req,
+            resp,
+            state,
+            method,
+            store_key,
+            instance._idempotent_in_flight,
+            functools.partial(store_response, store, store_key),
+            serialize_retries=True,
+        )
+        if stored is None:
+            return
+
+    replay_response(resp, stored)
+
+
+async def execute_handler(
+    instance: Base,
+    handler: ExecuteHandler,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+    method: str,
+) -> None:
+    """
+    Run an execute_on_{method} handler within the request's deadline, if any,
+    and encode its response media
+    :param instance: service instance
+    :param handler: execute_on_{method}
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :param method: responder hook, e.g. "on_get"
+    :return:
+    """
+    if state.deadline is None:
+        await run_handler(instance, handler, req, resp, state)
+    else:
+        try:
+            await within_deadline(
+                state, run_handler(instance, handler, req, resp, state)
+            )
+        except asyncio.TimeoutError:
+            if not state.deadline_exceeded():
+                raise
+            deadline_exceeded(req, resp, state, f"execute_{method}")
+            return
+
+    if instance._encoders is not None:
+        encode_media(instance._encoders, req, resp)
+
+
+async def run_handler(
+    instance: Base,
+    handler: ExecuteHandler,
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    state: RequestState,
+) -> None:
+    """
+    Run an execute_on_{method} handler within the class's concurrency limits,
+    a streamed response holds its slots until it's sent, see streaming.GuardedStream
+    :param instance: service instance
+    :param handler: execute_on_{method}
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param state: state of the request
+    :return:
+    """
+    # load shedding, see Base.max_in_flight
+    acquired: List[ConcurrencyLimiter] = []
+    try:
+        for limiter in instance._concurrency_limiters:
+            if not await limiter.acquire():
+                reject(req, resp, 503, SERVICE_OVERLOADED)  # Service Unavailable
+                render_failure(req, resp, state.reasons)
+                return
+            acquired.append(limiter)
+
+        await handler(instance, req, resp)
+
+        if resp._stream is not None:
+            # the stream is sent after on_{method} returns, it keeps the slots
+            # and the deadline until it's done
+            resp._stream = GuardedStream(resp._stream, acquired, state.deadline)
+            acquired = []
+    except RequestBodyTooLarge:
+        body_too_large(req, resp, state)
+    finally:
+        for limiter in acquired:
+            limiter.release()
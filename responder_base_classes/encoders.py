@@ -0,0 +1,190 @@
+__author__ = "icleary"
+
+import functools
+import json
+from typing import Any, Callable, Dict, NamedTuple, Optional, Sequence
+
+import responder
+import yaml
+
+from .media_types import parse_media_type
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+# number of distinct accept header values negotiation results are cached for
+ACCEPT_CACHE_SIZE = 256
+
+
+class Encoder(NamedTuple):
+    """Serializes resp.media to, and request bodies from, one format"""
+
+    format: str  # name used in allowed_content_types, e.g. "json"
+    media_type: str  # content type of encoded bodies, e.g. "application/json"
+    encode: Callable[[Any], bytes]
+    decode: Callable[[bytes], Any]
+
+
+def _encode_json_stdlib(media: Any) -> bytes:
+    return json.dumps(media).encode("utf-8")
+
+
+def _encode_orjson(media: Any) -> bytes:
+    try:
+        return orjson.dumps(media)  # type: ignore
+    except TypeError:
+        # e.g. non string dict keys, which the stdlib encoder converts
+        return _encode_json_stdlib(media)
+
+
+def _encode_yaml(media: Any) -> bytes:
+    return yaml.safe_dump(media).encode("utf-8")  # type: ignore
+
+
+JSON = Encoder(
+    "json",
+    "application/json",
+    _encode_json_stdlib if orjson is None else _encode_orjson,
+    json.loads if orjson is None else orjson.loads,
+)
+YAML = Encoder("yaml", "application/x-yaml", _encode_yaml, yaml.safe_load)
+
+# encoders by format, classes use those named in their allowed_content_types
+ENCODERS: Dict[str, Encoder] = {"json": JSON, "yaml": YAML}
+
+if msgpack is not None:
+    ENCODERS["msgpack"] = Encoder(
+        "msgpack", "application/msgpack", msgpack.packb, msgpack.unpackb
+    )
+
+
+def register_encoder(encoder: Encoder) -> None:
+    """
+    Add (or replace) the encoder of a format, for classes created afterwards
+    :param encoder: e.g. Encoder("csv", "text/csv", encode, decode)
+    :return:
+    """
+    ENCODERS[encoder.format] = encoder
+
+
+def _accept_quality(params: str) -> float:
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value)
+            except ValueError:
+                return 0.0
+    return 1.0
+
+
+class Encoders(object):
+    """
+    The encoders of a class, negotiated by the Accept header
+        - media ranges are weighed by their q value, ties go to the earlier range
+        - a range matches an encoder by media type ("application/json",
+          "application/*"), by format ("yaml", as responder accepts) or by
+          subtype ("text/yaml", "application/vnd.api+json")
+        - the first encoder is the default, for */* or no acceptable encoder
+    Negotiation results are cached per raw header value
+    """
+
+    def __init__(
+        self, encoders: Sequence[Encoder], cache_size: int = ACCEPT_CACHE_SIZE
+    ) -> None:
+        self.encoders = tuple(encoders)
+        self.default = self.encoders[0]
+        self.negotiate = functools.lru_cache(maxsize=cache_size)(self._negotiate)
+
+    def for_content_type(self, content_type: Optional[str]) -> Optional[Encoder]:
+        """
+        :param content_type: content-type header of a request
+        :return: encoder to decode its body with, or None
+        """
+        if content_type is None:
+            return None
+        return self._match(content_type.split(";", 1)[0].strip().lower())
+
+    def _negotiate(self, accept: Optional[str]) -> Encoder:
+        if not accept:
+            return self.default
+
+        best = None
+        best_quality = 0.0
+        for media_range in accept.split(","):
+            media_type, _, params = media_range.partition(";")
+            quality = _accept_quality(params) if params else 1.0
+            if quality <= best_quality:
+                continue
+
+            encoder = self._match(media_type.strip().lower())
+            if encoder is not None:
+                best, best_quality = encoder, quality
+
+        return self.default if best is None else best
+
+    def _match(self, media_type: str) -> Optional[Encoder]:
+        if media_type in ("*/*", "*"):
+            return self.default
+
+        for encoder in self.encoders:
+            if media_type in (encoder.media_type, encoder.format):
+                return encoder
+
+        parsed = parse_media_type(media_type)
+        if parsed is None:
+            return None
+        type_, subtype = parsed
+
+        for encoder in self.encoders:
+            if subtype == "*":
+                if encoder.media_type.startswith(f"{type_}/"):
+                    return encoder
+            elif encoder.format in (subtype, subtype.rpartition("+")[2]):
+                return encoder
+            elif subtype == f"x-{encoder.format}":
+                return encoder
+        return None
+
+
+def encoders_for(allowed_content_types: Sequence[str]) -> Optional[Encoders]:
+    """
+    Compile the encoders of a class, see Base
+    :param allowed_content_types: e.g. ["json", "yaml"]
+    :return: encoders of the allowed formats, in order, or None if there are none
+    """
+    if "msgpack" in allowed_content_types and "msgpack" not in ENCODERS:
+        raise RuntimeError("allowing msgpack requires the msgpack package")
+
+    encoders = [
+        ENCODERS[content_type]
+        for content_type in allowed_content_types
+        if content_type in ENCODERS
+    ]
+    return Encoders(encoders) if encoders else None
+
+
+def encode_media(
+    encoders: Encoders, req: responder.models.Request, resp: responder.models.Response
+) -> None:
+    """
+    Serialize resp.media once, with the encoder the request accepts,
+    instead of responder's stdlib formats
+    :param encoders: encoders of the class
+    :param req: Mutable request object
+    :param resp: Mutable response object, after execute_on_{method}
+    :return:
+    """
+    if resp.media is None or resp.content is not None or resp._stream is not None:
+        return
+
+    encoder = encoders.negotiate(req.headers.get("Accept"))
+    resp.content = encoder.encode(resp.media)
+    resp.mimetype = encoder.media_type
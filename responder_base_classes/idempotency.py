@@ -0,0 +1,128 @@
+__author__ = "icleary"
+
+import time
+from typing import Any, Callable, Dict, Hashable, NamedTuple, Optional
+
+import responder
+
+from .cache import TTLCache
+from .response_cache import render_body
+from .state import request_scope
+
+# responder hooks an Idempotency-Key applies to
+IDEMPOTENT_METHODS = frozenset(["on_post", "on_put", "on_patch"])
+
+
+class StoredResponse(NamedTuple):
+    """Rendered response of a request with an Idempotency-Key"""
+
+    status_code: int
+    body: bytes
+    headers: Dict[str, str]
+
+
+def idempotency_key(
+    req: responder.models.Request, method: str, key: str, user: Any
+) -> Hashable:
+    """
+    :param req: Mutable request object
+    :param method: responder hook, e.g. "on_post"
+    :param key: Idempotency-Key header value
+    :param user: authenticated user, or None
+    :return: store key, scoped to the method, path and user
+    """
+    return (
+        method,
+        request_scope(req).get("path"),
+        getattr(user, "username", None),
+        key,
+    )
+
+
+async def render_stored(resp: responder.models.Response) -> Optional[StoredResponse]:
+    """
+    :param resp: Mutable response object, after execute_on_{method}
+    :return: rendered response, or None for server errors, which may be retried
+    """
+    status_code = 200 if resp.status_code is None else resp.status_code
+    if status_code >= 500 or resp._stream is not None:
+        return None
+
+    body, headers = await render_body(resp)
+    return StoredResponse(status_code, body, headers)
+
+
+async def store_response(
+    store: "IdempotencyStore", key: Hashable, resp: responder.models.Response
+) -> Optional[StoredResponse]:
+    """
+    Render a response and store it, before concurrent duplicates are released
+    :param store: idempotency store of the class
+    :param key: see idempotency_key
+    :param resp: Mutable response object, after execute_on_{method}
+    :return: stored response, or None if it isn't stored
+    """
+    stored = await render_stored(resp)
+    if stored is not None:
+        await store.set(key, stored)
+    return stored
+
+
+def replay_response(resp: responder.models.Response, stored: StoredResponse) -> None:
+    """
+    :param resp: Mutable response object
+    :param stored: response to send, as is
+    :return:
+    """
+    resp.status_code = stored.status_code
+    resp.mimetype = None
+    # the request's own headers (e.g. set by on_request) are kept
+    resp.headers.update(stored.headers)
+    resp.content = stored.body
+
+
+class IdempotencyStore(object):
+    """
+    Responses of requests with an Idempotency-Key
+    Override get() and set() to share responses between workers, e.g. in redis,
+    keys are tuples of strings (and None)
+    """
+
+    async def get(self, key: Hashable) -> Optional[StoredResponse]:
+        """
+        :param key: see idempotency_key
+        :return: stored response, or None
+        """
+        raise NotImplementedError
+
+    async def set(self, key: Hashable, response: StoredResponse) -> None:
+        """
+        :param key: see idempotency_key
+        :param response: response to replay for the key
+        :return:
+        """
+        raise NotImplementedError
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """
+    In process responses, bounded by a TTL and LRU eviction, see cache.TTLCache
+    """
+
+    def __init__(
+        self,
+        ttl: float = 24 * 60 * 60,
+        maxsize: int = 10000,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.cache = TTLCache(ttl, maxsize, timer)
+
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    async def get(self, key: Hashable) -> Optional[StoredResponse]:
+        response: Optional[StoredResponse] = self.cache.get(key)
+        return response
+
+    async def set(self, key: Hashable, response: StoredResponse) -> None:
+        self.cache.set(key, response)
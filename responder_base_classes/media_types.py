@@ -0,0 +1,72 @@
+__author__ = "icleary"
+
+import functools
+from typing import Optional, Sequence, Set, Tuple
+
+# number of distinct content-type header values a matcher remembers
+CONTENT_TYPE_CACHE_SIZE = 256
+
+
+def parse_media_type(value: str) -> Optional[Tuple[str, str]]:
+    """
+    Parse a content-type header value, dropping parameters such as charset
+    :param value: e.g. "application/vnd.api+json; charset=utf-8"
+    :return: (type, subtype), e.g. ("application", "vnd.api+json"), or None
+    """
+    media_type = value.split(";", 1)[0].strip().lower()
+    type_, separator, subtype = media_type.partition("/")
+    if not separator or not type_ or not subtype:
+        return None
+    return type_, subtype
+
+
+class ContentTypeMatcher(object):
+    """
+    Matches content-type headers against a class's allowed_content_types,
+    compiled once per class, see Base
+    Each allowed content type is either
+        - a full media type, "application/json" or "application/*"
+        - a format, "json" matches application/json, text/json, application/x-json
+          and structured syntax suffixes such as application/vnd.api+json
+    Verdicts are cached per raw header value
+    """
+
+    def __init__(
+        self,
+        allowed_content_types: Sequence[str],
+        cache_size: int = CONTENT_TYPE_CACHE_SIZE,
+    ) -> None:
+        self.allowed_content_types = tuple(allowed_content_types)
+        self.media_types: Set[str] = set()
+        self.formats: Set[str] = set()
+
+        for content_type in allowed_content_types:
+            content_type = content_type.lower()
+            if "/" in content_type:
+                self.media_types.add(content_type)
+            else:
+                self.formats.add(content_type)
+
+        self.matches = functools.lru_cache(maxsize=cache_size)(self._matches)
+
+    def __call__(self, value: Optional[str]) -> bool:
+        """
+        :param value: content-type header value, or None if missing
+        :return: True if the content type is allowed
+        """
+        return value is not None and self.matches(value)
+
+    def _matches(self, value: str) -> bool:
+        parsed = parse_media_type(value)
+        if parsed is None:
+            return False
+
+        type_, subtype = parsed
+        if f"{type_}/{subtype}" in self.media_types or f"{type_}/*" in self.media_types:
+            return True
+
+        # the format is the subtype, without an x- prefix or before a +suffix
+        suffix = subtype.rpartition("+")[2]
+        if suffix in self.formats or subtype in self.formats:
+            return True
+        return subtype.startswith("x-") and subtype[2:] in self.formats
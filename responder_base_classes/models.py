@@ -1,7 +1,43 @@
+# stdlib imports
+import asyncio
+import functools
+import inspect
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
 # package imports
 import responder
 from pydantic import BaseModel
 
+# local imports
+from .batch import BatchLoader
+from .bodies import iter_body, iter_records, read_body
+from .cache import CredentialCache, NegativeCredentialCache
+from .circuit import CircuitBreaker, CircuitOpenError
+from .concurrency import ConcurrencyLimiter
+from .deadlines import parse_timeout
+from .encoders import Encoders, encoders_for
+from .idempotency import IdempotencyStore
+from .media_types import ContentTypeMatcher
+from .passwords import is_hashed, verify_password
+from .ratelimit import RateLimit
+from .response_cache import CachedResponse, ResponseCache
+from .streaming import STREAM_BUFFER_SIZE, resolve_streaming_handlers
+from .tokens import TokenSigner
+from .utils import ExecuteHandler, resolve_execute_handlers
+from .validation import body_models_for
+
 
 class User(BaseModel):
     username: str
@@ -21,14 +57,156 @@ class Base(object):
                 expects getattr(user, password) to match authorization, see valid_credential_format()
     """
 
-    _slots__ = ["allowed_to_execute_method"]
     # default to enforce the above to make classes be explicit
-    # __dict__ allows other variables to be assigned without __slots__ benefits
     allowed_content_types = ["json", "yaml", "html"]
 
+    # token bucket limits checked before anything else, see ratelimit.RateLimit
+    rate_limits: Sequence[RateLimit] = ()
+
+    # bounds the execute_on_{method} handlers of a class running at once,
+    # more requests wait in a queue of max_queued for up to queue_timeout seconds,
+    # then get a 503, see concurrency.ConcurrencyLimiter
+    max_in_flight: Optional[int] = None
+    max_queued = 0
+    queue_timeout: Optional[float] = None
+
+    # created from the above for each subclass at class creation, for monitoring
+    concurrency_limiter: Optional[ConcurrencyLimiter] = None
+
+    # opt in by setting a ConcurrencyLimiter shared with other classes, e.g. process wide
+    shared_concurrency_limiter: Optional[ConcurrencyLimiter] = None
+
+    # seconds a request may take, its on_request checks (e.g. get_user) and
+    # execute_on_{method} included, cancelled with a 504 once exceeded
+    # timeouts per (lower case) http method, e.g. {"post": 30}, override timeout
+    timeout: Optional[float] = None
+    timeouts: Mapping[str, float] = {}
+    # header clients may send a shorter timeout in, e.g. "X-Request-Timeout"
+    timeout_header: Optional[str] = None
+
+    # bytes a request body may have, larger bodies are rejected with a 413, by
+    # their content-length before they are read, or once iter_body reads past it
+    max_body_size: Optional[int] = None
+
+    # pydantic models of request bodies, validated before execute_on_{verb} runs,
+    # invalid bodies are rejected with a 422 listing the errors, the parsed model
+    # is RequestState.body, e.g. get_request_state(req).body
+    post_model: Optional[Type[BaseModel]] = None
+    put_model: Optional[Type[BaseModel]] = None
+    patch_model: Optional[Type[BaseModel]] = None
+
+    # opt in by setting a ResponseCache, GET and HEAD responses are served from it
+    # without running execute_on_{method}
+    response_cache: Optional[ResponseCache] = None
+
+    # identical concurrent GET and HEAD requests (same path, query, accept header
+    # and user) share one execute_on_{method} call, its rendered response is copied
+    coalesce_get = False
+
+    # opt in by setting an IdempotencyStore, POST, PUT and PATCH requests with an
+    # idempotency_header run execute_on_{method} once, retries replay its response
+    idempotency_store: Optional[IdempotencyStore] = None
+    idempotency_header = "Idempotency-Key"
+
+    # execute_on_{method} handlers may be async generators, their records are
+    # streamed as "ndjson" (one JSON record per line) or "json" (one array),
+    # sent in chunks of stream_buffer_size bytes, see streaming.stream_records
+    stream_format = "ndjson"
+    stream_buffer_size = STREAM_BUFFER_SIZE
+
+    # compiled from allowed_content_types once per subclass at class creation
+    _content_type_matcher = ContentTypeMatcher(allowed_content_types)
+
+    # encoders of the allowed formats with one, resp.media is serialized with the
+    # one the request accepts, see encoders.ENCODERS
+    _encoders: Optional[Encoders] = encoders_for(allowed_content_types)
+
+    # concurrency_limiter and shared_concurrency_limiter, if set
+    _concurrency_limiters: Tuple[ConcurrencyLimiter, ...] = ()
+
+    # {request key: rendered response future} of coalesced requests in flight
+    _get_in_flight: Dict[Hashable, "asyncio.Future[Optional[CachedResponse]]"] = {}
+    _idempotent_in_flight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+
+    # whether timeout, timeouts or timeout_header is set
+    _enforces_deadlines = False
+
+    # {on_method: execute_on_method}, resolved once per subclass at class creation
+    _execute_handlers: Dict[str, ExecuteHandler] = {}
+
+    # {on_method: model} of post_model, put_model and patch_model, if set
+    _body_models: Dict[str, Type[BaseModel]] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._content_type_matcher = ContentTypeMatcher(cls.allowed_content_types)
+        cls._encoders = encoders_for(cls.allowed_content_types)
+        cls._execute_handlers = resolve_streaming_handlers(
+            cls, resolve_execute_handlers(cls)
+        )
+        cls._body_models = body_models_for(cls)
+        cls._get_in_flight = {}
+        cls._idempotent_in_flight = {}
+
+        cls.concurrency_limiter = None
+        if cls.max_in_flight is not None:
+            cls.concurrency_limiter = ConcurrencyLimiter(
+                cls.max_in_flight, cls.max_queued, cls.queue_timeout
+            )
+        cls._concurrency_limiters = tuple(
+            limiter
+            for limiter in (cls.concurrency_limiter, cls.shared_concurrency_limiter)
+            if limiter is not None
+        )
+
+        cls._enforces_deadlines = bool(
+            cls.timeout is not None or cls.timeouts or cls.timeout_header
+        )
+
     def __init__(self) -> None:
-        self.allowed_to_execute_method = True
-        # on_method sets to this to false, if appropriate
+        # per request state lives in state.RequestState, not on the instance,
+        # so a single instance can be routed and shared by concurrent requests
+        pass
+
+    def request_timeout(self, req: responder.models.Request) -> Optional[float]:
+        """
+        Seconds the request may take, see timeout, timeouts and timeout_header
+        :param req: Mutable request object
+        :return: the shorter of the class's and the client's timeout, or None
+        """
+        timeout = self.timeouts.get(req.method, self.timeout)
+
+        if self.timeout_header is not None:
+            client_timeout = parse_timeout(req.headers.get(self.timeout_header))
+            if client_timeout is not None and (
+                timeout is None or client_timeout < timeout
+            ):
+                timeout = client_timeout
+
+        return timeout
+
+    def iter_body(self, req: responder.models.Request) -> AsyncIterator[bytes]:
+        """
+        Read the request body chunk by chunk, within max_body_size
+        :param req: Mutable request object
+        :return: chunks of the body, see bodies.iter_body
+        """
+        return iter_body(req, self.max_body_size)
+
+    async def read_body(self, req: responder.models.Request) -> bytes:
+        """
+        :param req: Mutable request object
+        :return: the request body, read within max_body_size
+        """
+        return await read_body(req, self.max_body_size)
+
+    def iter_records(self, req: responder.models.Request) -> AsyncIterator[Any]:
+        """
+        Parse an NDJSON request body record by record, within max_body_size
+        :param req: Mutable request object
+        :return: records of the body, see bodies.iter_records
+        """
+        return iter_records(req, self.max_body_size)
 
 
 class View(Base):
@@ -45,7 +223,84 @@ class Service(Base):
         super().__init__()
 
 
+def _finish_in_flight(
+    in_flight: Dict[str, "asyncio.Future[Any]"], key: str, future: "asyncio.Future[Any]"
+) -> None:
+    """
+    Done callback of a coalesced call, removes it once it's finished
+    :param in_flight: {key: future} of the calls in flight
+    :param key: key of the finished call
+    :param future: finished call
+    :return:
+    """
+    if in_flight.get(key) is future:
+        del in_flight[key]
+    if not future.cancelled():
+        # retrieved, so an exception with no waiters left isn't logged as unhandled
+        future.exception()
+
+
+# pools shared by every AuthService with the same configuration, so each route
+# doesn't start its own threads or processes
+_GET_USER_EXECUTORS: Dict[int, ThreadPoolExecutor] = {}  # by get_user_workers
+_PASSWORD_EXECUTORS: Dict[Tuple[bool, int], Executor] = {}
+
+
 class AuthServiceInterface(Service):
+    # size of the thread pool a synchronous get_user is offloaded to,
+    # 0 calls a synchronous get_user directly on the event loop
+    get_user_workers = 4
+
+    # verifies a password against User.password, see passwords.verify_password
+    # hashed passwords are verified in password_executor(), so this must be picklable
+    # (a module level function) if password_process_pool is set
+    password_verifier = staticmethod(verify_password)
+    password_workers = 2
+    password_process_pool = False  # verify in processes instead of threads
+
+    # opt in by setting a TokenSigner, issues session tokens after a password login
+    # and accepts them as "authorization: Bearer {token}" without calling get_user
+    session_tokens: Optional[TokenSigner] = None
+
+    # opt in by setting a CredentialCache, skips get_user for recently verified credentials
+    credential_cache: Optional[CredentialCache] = None
+
+    # share one in-flight get_user between concurrent requests for the same username
+    coalesce_get_user = False
+
+    # batches of concurrent lookups, if get_users is overridden
+    get_users_max_batch_size = 100
+    get_users_max_wait = 0.0  # seconds, 0 batches lookups made in the same loop tick
+
+    # opt in by setting a NegativeCredentialCache, rejects recently failed credentials
+    negative_credential_cache: Optional[NegativeCredentialCache] = None
+
+    # opt in by setting a CircuitBreaker, stops calling a degraded get_user/get_users,
+    # requests then get a 503 unless their credentials are in credential_cache
+    user_store_breaker: Optional[CircuitBreaker] = None
+
+    # resolved once per subclass at class creation
+    _get_user_is_coroutine = False
+    _get_users_is_coroutine = False
+    _batch_get_users = False
+    _get_users_loader: Optional[BatchLoader] = None
+    _password_executor: Optional[Executor] = None
+    _get_user_executor: Optional[ThreadPoolExecutor] = None
+    _get_user_in_flight: Dict[str, "asyncio.Future[Optional[User]]"] = {}
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._get_user_is_coroutine = inspect.iscoroutinefunction(cls.get_user)
+        cls._get_users_is_coroutine = inspect.iscoroutinefunction(cls.get_users)
+        cls._batch_get_users = any(
+            "get_users" in vars(klass)
+            for klass in cls.__mro__[: cls.__mro__.index(AuthServiceInterface)]
+        )
+        cls._get_users_loader = None
+        cls._password_executor = None
+        cls._get_user_executor = None
+        cls._get_user_in_flight = {}
+
     def __init__(self) -> None:
         super().__init__()
 
@@ -53,11 +308,185 @@ class AuthServiceInterface(Service):
     def get_user(cls, req: responder.models.Request) -> User:
         """
         Get User Class Object, facilitates checking credentials
+            May be overridden with either a def or an async def
+            The username is get_request_state(req).credentials.username
         :param req: Mutable request object
         :return: user: User object that has password->str used for authentication
         """
         raise NotImplementedError
 
+    @classmethod
+    def get_users(cls, usernames: List[str]) -> Mapping[str, User]:
+        """
+        Optional batch version of get_user, e.g. one WHERE username IN (...) query
+            If overridden, concurrent lookups are batched through get_users_loader()
+            May be overridden with either a def or an async def
+        :param usernames: unique usernames to look up
+        :return: {username: User}, usernames that don't exist may be left out
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def user_from_session_token(cls, username: str) -> User:
+        """
+        User for a request authenticated with a session token, without the user store
+            passed to valid_credentials_for_route, override to add e.g. roles
+        :param username: username the token was issued to
+        :return: user: User object, the password isn't known
+        """
+        return User(username=username, password="")
+
+    @classmethod
+    def get_user_executor(cls) -> ThreadPoolExecutor:
+        """
+        Thread pool for a synchronous get_user, created on first use
+            shared with the other classes that have the same get_user_workers
+        :return: executor bounded to get_user_workers threads
+        """
+        if cls._get_user_executor is None:
+            executor = _GET_USER_EXECUTORS.get(cls.get_user_workers)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=cls.get_user_workers,
+                    thread_name_prefix=f"get_user.{cls.get_user_workers}",
+                )
+                _GET_USER_EXECUTORS[cls.get_user_workers] = executor
+            cls._get_user_executor = executor
+        return cls._get_user_executor
+
+    async def lookup_user(
+        self, req: responder.models.Request, username: str
+    ) -> Optional[User]:
+        """
+        Call get_user without blocking the event loop
+            async def get_user is awaited, def get_user runs in get_user_executor()
+            with coalesce_get_user, concurrent lookups of a username share one call
+            if get_users is overridden, lookups are batched instead of calling get_user
+        :param req: Mutable request object
+        :param username: username from the request's credentials
+        :return: user: User object or None if the user doesn't exist
+        :raises CircuitOpenError: if user_store_breaker is open
+        """
+        if not self.coalesce_get_user:
+            return await self._call_user_store(req, username)
+
+        in_flight = self._get_user_in_flight
+
+        future = in_flight.get(username)
+        if future is None:
+            future = asyncio.ensure_future(self._call_user_store(req, username))
+            in_flight[username] = future
+            future.add_done_callback(
+                functools.partial(_finish_in_flight, in_flight, username)
+            )
+
+        # a cancelled waiter doesn't cancel the lookup the other waiters share
+        return await asyncio.shield(future)
+
+    @classmethod
+    def password_executor(cls) -> Executor:
+        """
+        Pool hashed passwords are verified in, created on first use
+            shared with the other classes that have the same password_process_pool
+            and password_workers
+        :return: executor bounded to password_workers threads or processes
+        """
+        if cls._password_executor is None:
+            key = (cls.password_process_pool, cls.password_workers)
+            executor = _PASSWORD_EXECUTORS.get(key)
+            if executor is None:
+                if cls.password_process_pool:
+                    executor = ProcessPoolExecutor(max_workers=cls.password_workers)
+                else:
+                    executor = ThreadPoolExecutor(
+                        max_workers=cls.password_workers,
+                        thread_name_prefix=f"password.{cls.password_workers}",
+                    )
+                _PASSWORD_EXECUTORS[key] = executor
+            cls._password_executor = executor
+        return cls._password_executor
+
+    async def check_password(self, password: str, user: User) -> bool:
+        """
+        Check a request's password against user.password, in constant time
+            plaintext is compared inline, hashes are verified in password_executor()
+        :param password: password from the request
+        :param user: User object returned by get_user
+        :return: True if the password matches
+        """
+        stored = user.password
+
+        if not is_hashed(stored):
+            return self.password_verifier(password, stored)
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.password_executor(), self.password_verifier, password, stored
+        )
+
+    def get_users_loader(self) -> BatchLoader:
+        """
+        Batches concurrent lookups into get_users calls, created on first use
+            shared by the class, so get_users shouldn't depend on instance state
+        :return: loader of usernames
+        """
+        cls = type(self)
+        if cls._get_users_loader is None:
+            cls._get_users_loader = BatchLoader(
+                self._call_get_users,  # type: ignore
+                max_batch_size=self.get_users_max_batch_size,
+                max_wait=self.get_users_max_wait,
+            )
+        return cls._get_users_loader
+
+    async def _call_user_store(
+        self, req: responder.models.Request, username: str
+    ) -> Optional[User]:
+        breaker = self.user_store_breaker
+        if breaker is None:
+            return await self._call_get_user(req, username)
+
+        if not breaker.allow():
+            raise CircuitOpenError(f"{type(self).__name__}.user_store_breaker is open")
+
+        started_at = breaker.timer()
+        try:
+            user = await self._call_get_user(req, username)
+        except (Exception, asyncio.CancelledError):
+            breaker.record(False)
+            raise
+
+        breaker.record(True, breaker.timer() - started_at)
+        return user
+
+    async def _call_get_user(
+        self, req: responder.models.Request, username: str
+    ) -> Optional[User]:
+        if self._batch_get_users:
+            user: Optional[User] = await self.get_users_loader().load(username)
+            return user
+
+        if self._get_user_is_coroutine:
+            return await self.get_user(req)  # type: ignore
+
+        if not self.get_user_workers:
+            return self.get_user(req)
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.get_user_executor(), self.get_user, req)
+
+    async def _call_get_users(self, usernames: List[str]) -> Mapping[str, User]:
+        if self._get_users_is_coroutine:
+            return await self.get_users(usernames)  # type: ignore
+
+        if not self.get_user_workers:
+            return self.get_users(usernames)
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.get_user_executor(), self.get_users, usernames
+        )
+
     @classmethod
     def valid_credentials_for_route(
         cls, req: responder.models.Request, user: User
@@ -3,7 +3,9 @@ __author__ = "icleary"
 import responder
 
 from .decorators import (
+    bounded_body,
     execute_on_method_if_allowed_to_execute_method,
+    rate_limited,
     valid_content_type,
 )
 from .models import Service
@@ -60,7 +62,9 @@ class OpenService(Service):
     ) -> None:
         pass
 
+    @rate_limited
     @valid_content_type
+    @bounded_body
     async def on_request(
         self, req: responder.models.Request, resp: responder.models.Response
     ) -> None:
@@ -72,8 +76,8 @@ class OpenService(Service):
         """
 
         # valid content type, execute on_request method
-        execute_function_name = "execute_on_request"
-        if hasattr(self, execute_function_name):
-            await getattr(self, execute_function_name)(req, resp)
+        handler = self._execute_handlers.get("on_request")
+        if handler is not None:
+            await handler(self, req, resp)
 
         return
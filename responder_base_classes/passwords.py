@@ -0,0 +1,123 @@
+__author__ = "icleary"
+
+import base64
+import hashlib
+import hmac
+import os
+import re
+from typing import Callable, Dict, Pattern, Tuple
+
+# encoded hashes look like {scheme}${parameters}${salt}${hash}
+PBKDF2_SHA256 = "pbkdf2_sha256"
+SCRYPT = "scrypt"
+
+PBKDF2_ITERATIONS = 260000
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2**14, 8, 1
+SALT_BYTES = 16
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.b64decode(data.encode("ascii"))
+
+
+def _hash_pbkdf2_sha256(password: str, salt: bytes, iterations: int) -> str:
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{PBKDF2_SHA256}${iterations}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def _hash_scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> str:
+    digest = hashlib.scrypt(  # type: ignore
+        password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=128 * n * r * 2
+    )
+    return f"{SCRYPT}${n}${r}${p}${_b64encode(salt)}${_b64encode(digest)}"
+
+
+def _verify_pbkdf2_sha256(password: str, encoded: str) -> bool:
+    _scheme, iterations, salt, _digest = encoded.split("$")
+    expected = _hash_pbkdf2_sha256(password, _b64decode(salt), int(iterations))
+    return hmac.compare_digest(expected.encode("ascii"), encoded.encode("ascii"))
+
+
+def _verify_scrypt(password: str, encoded: str) -> bool:
+    _scheme, n, r, p, salt, _digest = encoded.split("$")
+    expected = _hash_scrypt(password, _b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(expected.encode("ascii"), encoded.encode("ascii"))
+
+
+VERIFIERS: Dict[str, Callable[[str, str], bool]] = {
+    PBKDF2_SHA256: _verify_pbkdf2_sha256
+}
+if hasattr(hashlib, "scrypt"):
+    # only if python was built against OpenSSL 1.1+
+    VERIFIERS[SCRYPT] = _verify_scrypt
+
+
+_B64 = "[A-Za-z0-9+/]+={0,2}"
+_CRYPT64 = "[./A-Za-z0-9]"
+
+# formats a stored password is recognised as a hash by, anything else is plaintext
+HASH_FORMATS: Tuple[Pattern[str], ...] = (
+    # hash_password() output, even if this python can't verify its scheme
+    re.compile(rf"{PBKDF2_SHA256}\$\d+\${_B64}\${_B64}"),
+    re.compile(rf"{SCRYPT}\$\d+\$\d+\$\d+\${_B64}\${_B64}"),
+    # modular crypt format hashes of other libraries
+    re.compile(rf"\$2[abxy]?\$\d{{2}}\${_CRYPT64}{{53}}"),  # bcrypt
+    re.compile(r"\$argon2(id|i|d)\$v=\d+\$m=\d+,t=\d+,p=\d+\$[^$]+\$[^$]+"),
+    re.compile(rf"\$[56]\$(rounds=\d+\$)?{_CRYPT64}{{0,16}}\${_CRYPT64}+"),  # sha-crypt
+    re.compile(rf"\$1\${_CRYPT64}{{0,8}}\${_CRYPT64}{{22}}"),  # md5-crypt
+)
+
+
+def hash_password(password: str, scheme: str = PBKDF2_SHA256) -> str:
+    """
+    Hash a password for storage, e.g. as User.password
+    :param password: plaintext password
+    :param scheme: PBKDF2_SHA256 or SCRYPT
+    :return: encoded hash, including scheme, parameters and salt
+    """
+    salt = os.urandom(SALT_BYTES)
+
+    if scheme == PBKDF2_SHA256:
+        return _hash_pbkdf2_sha256(password, salt, PBKDF2_ITERATIONS)
+    if scheme == SCRYPT and SCRYPT in VERIFIERS:
+        return _hash_scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+    raise ValueError(f"unsupported password hashing scheme: {scheme}")
+
+
+def is_hashed(stored: str) -> bool:
+    """
+    Whether a stored password is a hash (slow to verify) rather than plaintext
+    :param stored: stored password, e.g. User.password
+    :return: True if it matches one of HASH_FORMATS, e.g. hash_password() output
+        or a bcrypt hash, so a plaintext password like "$ecret" stays plaintext
+    """
+    return any(format_.fullmatch(stored) for format_ in HASH_FORMATS)
+
+
+def verify_password(password: str, stored: str) -> bool:
+    """
+    Constant time check of a password against a stored password
+    Module level, so it can be run in a process pool
+    :param password: plaintext password from the request
+    :param stored: hash_password() output, or a plaintext password
+    :return: True if the password matches, False for hashes of unsupported schemes
+    """
+    if not is_hashed(stored):
+        # plaintext stored password
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8"))
+
+    verifier = VERIFIERS.get(stored.split("$", 1)[0])
+    if verifier is None:
+        # a hash without a verifier, e.g. bcrypt, never matches
+        return False
+
+    try:
+        return verifier(password, stored)
+    except ValueError:
+        # malformed hash
+        return False
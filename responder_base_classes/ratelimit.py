@@ -0,0 +1,196 @@
+__author__ = "icleary"
+
+import time
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import responder
+
+from .state import get_request_state, request_scope
+from .utils import parse_basic_authorization
+
+# client key of a rate limit, None exempts the request from the limit
+KeyFunction = Callable[[responder.models.Request], Optional[Hashable]]
+
+
+class RateLimitStore(object):
+    """
+    Token buckets of every RateLimit using the store
+    Override take() to share buckets between workers, e.g. in redis
+    """
+
+    async def take(self, key: Hashable, rate: float, capacity: float) -> float:
+        """
+        Take a token from a bucket, refilled at rate tokens per second
+        :param key: bucket key
+        :param rate: tokens added per second
+        :param capacity: most tokens the bucket holds, i.e. the allowed burst
+        :return: 0 if a token was taken, else seconds until one is available
+        """
+        raise NotImplementedError
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """
+    In process token buckets, O(1) per take
+        - buckets that refilled completely are dropped every compact_interval
+          seconds, a dropped bucket is the same as a new (full) one
+    Not thread safe, meant to be used from the event loop
+    """
+
+    def __init__(
+        self,
+        compact_interval: float = 60,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.compact_interval = compact_interval
+        self.timer = timer
+        # key -> [tokens, updated_at, full_at]
+        self._buckets: Dict[Hashable, List[float]] = {}
+        self._compact_at = timer() + compact_interval
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, key: Hashable, rate: float, capacity: float) -> float:
+        now = self.timer()
+        if now >= self._compact_at:
+            self.compact()
+
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+
+        if tokens < 1:
+            return (1 - tokens) / rate
+
+        tokens -= 1
+        self._buckets[key] = [tokens, now, now + (capacity - tokens) / rate]
+        return 0
+
+    def compact(self) -> None:
+        """
+        Drop idle buckets, those that refilled completely
+        :return:
+        """
+        now = self.timer()
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items() if bucket[2] > now
+        }
+        self._compact_at = now + self.compact_interval
+
+
+def client_ip(req: responder.models.Request) -> Optional[Hashable]:
+    """
+    :param req: Mutable request object
+    :return: address of the connected client (the proxy, if behind one)
+    """
+    client = request_scope(req).get("client")
+    return client[0] if client else None
+
+
+def claimed_username(req: responder.models.Request) -> Optional[Hashable]:
+    """
+    Username a request claims, before its credentials are verified
+    :param req: Mutable request object
+    :return: username, or the client ip if the request names no user
+    """
+    credentials = get_request_state(req).credentials
+    if credentials is not None:
+        return credentials.username
+
+    headers = req.headers
+    if "username" in headers:
+        username: str = headers["username"]
+        return username
+
+    if "authorization" in headers:
+        credentials = parse_basic_authorization(headers["authorization"])
+        if credentials is not None:
+            return credentials.username
+
+    return client_ip(req)
+
+
+def whole_route(req: responder.models.Request) -> Optional[Hashable]:
+    """
+    :param req: Mutable request object
+    :return: one key for every request
+    """
+    return ""
+
+
+KEY_FUNCTIONS: Dict[str, KeyFunction] = {
+    "ip": client_ip,
+    "username": claimed_username,
+    "route": whole_route,
+}
+
+
+class RateLimit(object):
+    """
+    Token bucket rate limit of a service class, e.g.
+        rate_limits = [RateLimit(100, per=60, key="ip")]
+        - every class (route) using the limit has its own buckets
+        - key is "ip", "username", "route" or a function of the request
+        - methods limits only those http methods, each with its own buckets
+    """
+
+    def __init__(
+        self,
+        requests: float,
+        per: float = 1.0,
+        burst: Optional[float] = None,
+        key: Union[str, KeyFunction] = "ip",
+        methods: Optional[Iterable[str]] = None,
+        store: Optional[RateLimitStore] = None,
+    ) -> None:
+        """
+        :param requests: requests allowed every per seconds
+        :param per: seconds
+        :param burst: requests allowed at once, defaults to requests
+        :param key: what the limit applies to, see KEY_FUNCTIONS
+        :param methods: e.g. ["post"], defaults to every method
+        :param store: buckets, defaults to a MemoryRateLimitStore
+        """
+        self.rate = requests / per
+        self.capacity = requests if burst is None else burst
+        self.key = KEY_FUNCTIONS[key] if isinstance(key, str) else key
+        self.methods = (
+            None if methods is None else frozenset(m.lower() for m in methods)
+        )
+        self.store = MemoryRateLimitStore() if store is None else store
+
+    async def retry_after(
+        self, scope: str, req: responder.models.Request
+    ) -> Optional[float]:
+        """
+        Take a token for the request
+        :param scope: name of the class (route) the request is for
+        :param req: Mutable request object
+        :return: seconds until the request is allowed, or None if it is allowed now
+        """
+        method = req.method
+        if self.methods is not None and method not in self.methods:
+            return None
+
+        client = self.key(req)
+        if client is None:
+            return None
+
+        bucket: Tuple[Hashable, ...] = (scope, client)
+        if self.methods is not None:
+            bucket += (method,)
+
+        wait = await self.store.take(bucket, self.rate, self.capacity)
+        return wait or None
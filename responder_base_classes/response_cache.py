@@ -0,0 +1,191 @@
+__author__ = "icleary"
+
+import hashlib
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import responder
+
+from .cache import TTLCache
+from .state import request_scope
+from .tokens import SESSION_TOKEN_HEADER
+
+# responder hooks whose responses may be cached
+CACHEABLE_METHODS = frozenset(["on_get", "on_head"])
+
+
+class CachedResponse(NamedTuple):
+    """Rendered response, see ResponseCache"""
+
+    body: bytes
+    headers: Dict[str, str]
+    etag: str
+
+
+def response_key(
+    req: responder.models.Request,
+    method: str,
+    user: Any,
+    vary: Sequence[str] = ("accept",),
+    per_user: bool = True,
+) -> Hashable:
+    """
+    Identifies requests that get the same response
+    :param req: Mutable request object
+    :param method: responder hook, e.g. "on_get"
+    :param user: authenticated user, or None
+    :param vary: lower case names of the request headers the response depends on
+    :param per_user: whether the response depends on the user
+    :return: key of the request
+    """
+    scope = request_scope(req)
+    headers = req.headers
+    return (
+        method,
+        scope.get("path"),
+        scope.get("query_string"),
+        tuple(headers.get(header) for header in vary),
+        getattr(user, "username", None) if per_user else None,
+    )
+
+
+def compute_etag(body: bytes) -> str:
+    """
+    :param body: rendered response body
+    :return: strong entity tag, quoted
+    """
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison, as If-None-Match requires
+    :param if_none_match: If-None-Match header value, e.g. '"a", W/"b"' or '*'
+    :param etag: entity tag of the current response
+    :return: True if the client's copy is current
+    """
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+async def render_body(
+    resp: responder.models.Response,
+) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Serialize a response the way responder would send it
+    :param resp: Mutable response object, after execute_on_{method}
+    :return: body and headers
+    """
+    body, headers = await resp.body
+    headers.update(resp.headers)
+
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    return body, headers
+
+
+async def render_response(resp: responder.models.Response) -> Optional[CachedResponse]:
+    """
+    Render a response the way responder would send it, headers set by
+    execute_on_{method} included, see decorators.execute_and_render
+    :param resp: Mutable response object, after execute_on_{method}
+    :return: rendered response, or None if it shouldn't be cached
+    """
+    if resp.status_code not in (None, 200) or resp._stream is not None:
+        return None
+    if resp.cookies:
+        return None
+
+    body, headers = await render_body(resp)
+    if "no-store" in headers.get("Cache-Control", ""):
+        return None
+    # never shared, even if a handler sets one
+    headers.pop(SESSION_TOKEN_HEADER, None)
+
+    etag = compute_etag(body)
+    headers["ETag"] = etag
+    return CachedResponse(body, headers, etag)
+
+
+def serve_response(
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    rendered: CachedResponse,
+    headers_only: bool = False,
+) -> None:
+    """
+    Answer with a rendered response, or 304 if the client's copy is current
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param rendered: rendered response
+    :param headers_only: answer a HEAD with the headers of a GET, Content-Length included
+    :return:
+    """
+    resp.mimetype = None
+    # the request's own headers (e.g. set by on_request) are kept
+    resp.headers.update(rendered.headers)
+
+    if etag_matches(req.headers.get("If-None-Match"), rendered.etag):
+        resp.status_code = 304  # Not Modified
+        resp.content = b""
+        return
+
+    resp.status_code = 200  # OK
+    if headers_only:
+        resp.headers["Content-Length"] = str(len(rendered.body))
+        resp.content = b""
+    else:
+        resp.content = rendered.body
+
+
+class ResponseCache(TTLCache):
+    """
+    Rendered GET and HEAD responses, so repeated requests skip execute_on_{method}
+        - keyed by method, path, query string and the vary request headers,
+          and the authenticated user (RequestState.user) if per_user
+        - only 200 responses without cookies or Cache-Control: no-store are cached
+        - responses get a strong ETag, If-None-Match is answered with 304
+        - on_request still runs, so authentication and authorization are enforced
+        - set as a class attribute on an OpenService or AuthService to opt in, e.g.
+            response_cache = ResponseCache(ttl=30, maxsize=1024)
+    """
+
+    def __init__(
+        self,
+        ttl: float = 30,
+        maxsize: int = 1024,
+        vary: Sequence[str] = ("accept",),
+        per_user: bool = True,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        super().__init__(ttl, maxsize, timer)
+        self.vary = tuple(header.lower() for header in vary)
+        self.per_user = per_user
+
+    def key(self, req: responder.models.Request, method: str, user: Any) -> Hashable:
+        """
+        :param req: Mutable request object
+        :param method: responder hook, e.g. "on_get"
+        :param user: authenticated user, or None
+        :return: cache key of the request
+        """
+        return response_key(req, method, user, self.vary, self.per_user)
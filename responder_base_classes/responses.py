@@ -0,0 +1,105 @@
+__author__ = "icleary"
+
+import functools
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+import responder
+import yaml
+
+from .state import get_request_state
+
+# number of distinct (reasons, format) failure bodies encode_failure remembers
+FAILURE_BODY_CACHE_SIZE = 512
+
+# failure bodies are encoded like responder's own json and yaml formats,
+# in the order responder negotiates them, json is the default
+FAILURE_ENCODERS: Dict[str, Tuple[Callable[[dict], str], str]] = {
+    "json": (json.dumps, "application/json"),
+    "yaml": (yaml.safe_dump, "application/x-yaml"),
+}
+
+
+def negotiate_format(req: responder.models.Request) -> str:
+    """
+    Pick the format of a failure body the way responder picks resp.media's
+    :param req: Mutable request object
+    :return: "json" or "yaml"
+    """
+    accept = req.headers.get("Accept", "")
+    for format_ in FAILURE_ENCODERS:
+        if format_ in accept:
+            return format_
+    return "json"
+
+
+@functools.lru_cache(maxsize=FAILURE_BODY_CACHE_SIZE)
+def encode_failure(reasons: Tuple[str, ...], format_: str) -> bytes:
+    """
+    Encode a failure body, once per distinct set of reasons
+    :param reasons: why the request failed, oldest first
+    :param format_: key of FAILURE_ENCODERS
+    :return: encoded {"status": "failure", "reason": ...}, newest reason first
+    """
+    encoder, _mimetype = FAILURE_ENCODERS[format_]
+    reason = "; ".join(reversed(reasons)) if reasons else None
+    return encoder({"status": "failure", "reason": reason}).encode("utf-8")
+
+
+def reject(
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    status_code: int,
+    reason: str,
+) -> bool:
+    """
+    Fail a request check, the body is rendered once the pipeline stops
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param status_code: e.g. 401
+    :param reason: why the request was rejected
+    :return: False, to stop the pipeline
+    """
+    state = get_request_state(req)
+    state.reasons += (reason,)
+    resp.status_code = status_code
+    return False
+
+
+def render_failure(
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    reasons: Tuple[str, ...],
+) -> None:
+    """
+    Set a pre-encoded failure body, skipping responder's serialization
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param reasons: why the request failed, oldest first
+    :return:
+    """
+    format_ = negotiate_format(req)
+    resp.content = encode_failure(reasons, format_)
+    resp.mimetype = FAILURE_ENCODERS[format_][1]
+
+
+def render_errors(
+    req: responder.models.Request,
+    resp: responder.models.Response,
+    reasons: Tuple[str, ...],
+    errors: List[Dict[str, Any]],
+) -> None:
+    """
+    Set a failure body listing errors, e.g. of request body validation
+    :param req: Mutable request object
+    :param resp: Mutable response object
+    :param reasons: why the request failed, oldest first
+    :param errors: structured errors, see validation.structure_errors
+    :return:
+    """
+    format_ = negotiate_format(req)
+    encoder, mimetype = FAILURE_ENCODERS[format_]
+    reason = "; ".join(reversed(reasons)) if reasons else None
+    failure = {"status": "failure", "reason": reason, "errors": errors}
+    resp.content = encoder(failure).encode("utf-8")
+    resp.mimetype = mimetype
@@ -0,0 +1,102 @@
+__author__ = "icleary"
+
+import time
+from typing import Any, MutableMapping, Optional, Tuple
+
+import responder
+
+from .utils import Credentials
+
+# key of the RequestState in the ASGI scope, namespaced to this package
+REQUEST_STATE_KEY = "responder_base_classes.state"
+
+
+class RequestState(object):
+    """
+    Per request state, shared by on_request and on_{method}
+    Lives in the request's ASGI scope rather than on the service instance,
+    so one instance can serve any number of concurrent requests
+    """
+
+    __slots__ = [
+        "allowed_to_execute_method",
+        "body",
+        "credentials",
+        "deadline",
+        "reasons",
+        "session_username",
+        "user",
+    ]
+
+    def __init__(self) -> None:
+        self.allowed_to_execute_method = True
+        # on_request checks set this to false, if appropriate
+
+        # time.monotonic() the request must be done by, see start_deadline
+        self.deadline: Optional[float] = None
+
+        # why the request was rejected, oldest first, see responses.reject
+        self.reasons: Tuple[str, ...] = ()
+
+        # username and password, once check_credential_format passes
+        self.credentials: Optional[Credentials] = None
+
+        # username from a verified session token, see tokens.TokenSigner
+        self.session_username: Optional[str] = None
+
+        # authenticated user, once check_credentials passes
+        self.user: Any = None
+
+        # request body parsed by the class's {verb}_model, e.g. Base.post_model
+        self.body: Any = None
+
+    def start_deadline(self, timeout: Optional[float]) -> None:
+        """
+        :param timeout: seconds the request may take from now, None for no deadline
+        :return:
+        """
+        if timeout is not None:
+            self.deadline = time.monotonic() + timeout
+
+    def time_remaining(self) -> Optional[float]:
+        """
+        Remaining budget of the request, e.g. for timeouts of downstream calls
+        :return: seconds until the deadline (0 once passed), or None if no deadline
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def deadline_exceeded(self) -> bool:
+        """
+        :return: True if the request has a deadline and it has passed
+        """
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+
+def request_scope(req: responder.models.Request) -> MutableMapping[str, Any]:
+    """
+    ASGI scope of the request
+    responder runs on_request and on_{method} in separate tasks,
+    so the scope (not a contextvar) is what both of them share
+    :param req: Mutable request object
+    :return: scope dictionary
+    """
+    starlette_request = req._starlette
+    scope: MutableMapping[str, Any] = getattr(starlette_request, "scope", None) or (
+        starlette_request._scope
+    )
+    return scope
+
+
+def get_request_state(req: responder.models.Request) -> RequestState:
+    """
+    Get (or create) the RequestState of a request
+    :param req: Mutable request object
+    :return: state: RequestState for this request
+    """
+    scope = request_scope(req)
+    state = scope.get(REQUEST_STATE_KEY)
+    if state is None:
+        state = scope[REQUEST_STATE_KEY] = RequestState()
+    return state
@@ -0,0 +1,205 @@
+__author__ = "icleary"
+
+import asyncio
+import inspect
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Sequence
+
+import responder
+
+from .concurrency import ConcurrencyLimiter
+from .encoders import JSON
+from .utils import ExecuteHandler
+
+# execute_on_{method} handlers that are async generators, yielding records
+RecordsHandler = Callable[
+    [Any, responder.models.Request, responder.models.Response], AsyncIterator[Any]
+]
+
+# content type of each stream format
+STREAM_FORMATS: Dict[str, str] = {
+    "ndjson": "application/x-ndjson",  # one JSON record per line
+    "json": "application/json",  # one JSON array, sent in chunks
+}
+
+# encoded records are sent once this many bytes are buffered
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+async def ndjson_chunks(
+    records: AsyncIterator[Any],
+    encode: Callable[[Any], bytes] = JSON.encode,
+    buffer_size: int = STREAM_BUFFER_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    :param records: yields JSON serializable records
+    :param encode: serializes a record
+    :param buffer_size: bytes buffered before a chunk is yielded
+    :return: chunks of newline delimited JSON
+    """
+    buffer = bytearray()
+    async for record in records:
+        buffer += encode(record)
+        buffer += b"\n"
+        if len(buffer) >= buffer_size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+async def json_array_chunks(
+    records: AsyncIterator[Any],
+    encode: Callable[[Any], bytes] = JSON.encode,
+    buffer_size: int = STREAM_BUFFER_SIZE,
+) -> AsyncIterator[bytes]:
+    """
+    :param records: yields JSON serializable records
+    :param encode: serializes a record
+    :param buffer_size: bytes buffered before a chunk is yielded
+    :return: chunks of a JSON array of the records
+    """
+    buffer = bytearray(b"[")
+    separator = b""
+    async for record in records:
+        buffer += separator
+        buffer += encode(record)
+        separator = b","
+        if len(buffer) >= buffer_size:
+            yield bytes(buffer)
+            buffer.clear()
+
+    buffer += b"]"
+    yield bytes(buffer)
+
+
+CHUNKERS = {"ndjson": ndjson_chunks, "json": json_array_chunks}
+
+
+def stream_records(
+    resp: responder.models.Response,
+    records: AsyncIterator[Any],
+    format_: str = "ndjson",
+    buffer_size: int = STREAM_BUFFER_SIZE,
+) -> None:
+    """
+    Send records as they are produced, instead of materializing resp.media
+        - records are pulled as the client reads the response, so a slow client
+          slows the producer down rather than buffering the stream in memory
+        - the status code and headers are sent before the first record, an error
+          while streaming cuts the response short
+    :param resp: Mutable response object
+    :param records: e.g. an async generator of rows
+    :param format_: see STREAM_FORMATS
+    :param buffer_size: bytes buffered before a chunk is sent
+    :return:
+    """
+    resp.stream(CHUNKERS[format_], records, JSON.encode, buffer_size)
+    resp.headers["Content-Type"] = STREAM_FORMATS[format_]
+
+
+class GuardedStream(object):
+    """
+    A response stream (resp._stream) that stays within its request's limits after
+    on_{method} returns, while responder sends it
+        - holds the request's ConcurrencyLimiter slots until the stream finishes,
+          fails or is dropped unsent
+        - stops pulling chunks once the request's deadline passes, raising
+          asyncio.TimeoutError, which cuts the response short
+    """
+
+    def __init__(
+        self,
+        stream: Callable[[], AsyncIterator[bytes]],
+        limiters: Sequence[ConcurrencyLimiter] = (),
+        deadline: Optional[float] = None,
+    ) -> None:
+        """
+        :param stream: resp._stream, returns the chunks of the response
+        :param limiters: acquired limiters, released once
+        :param deadline: time.monotonic() the stream must be sent by, or None
+        """
+        self.stream = stream
+        self.limiters = list(limiters)
+        self.deadline = deadline
+
+    def __call__(self) -> AsyncIterator[bytes]:
+        chunks = self._chunks()
+        # a generator that is never iterated doesn't run its finally clause
+        weakref.finalize(chunks, self.release)
+        return chunks
+
+    def release(self) -> None:
+        """
+        Release the held limiter slots, once
+        :return:
+        """
+        limiters, self.limiters = self.limiters, []
+        for limiter in limiters:
+            limiter.release()
+
+    async def _chunks(self) -> AsyncIterator[bytes]:
+        chunks = self.stream()
+        try:
+            if self.deadline is None:
+                async for chunk in chunks:
+                    yield chunk
+                return
+
+            while True:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        finally:
+            self.release()
+            await chunks.aclose()  # type: ignore
+
+
+def streaming_handler(
+    records: RecordsHandler, format_: str, buffer_size: int = STREAM_BUFFER_SIZE
+) -> ExecuteHandler:
+    """
+    Adapt an async generator execute_on_{method} to stream its records
+    :param records: resolved handler, records(instance, req, resp)
+    :param format_: see STREAM_FORMATS
+    :param buffer_size: bytes buffered before a chunk is sent
+    :return: handler(instance, req, resp)
+    """
+    if format_ not in STREAM_FORMATS:
+        raise RuntimeError(f"stream_format must be one of {sorted(STREAM_FORMATS)}")
+
+    async def handler(
+        instance: Any, req: responder.models.Request, resp: responder.models.Response
+    ) -> None:
+        stream_records(resp, records(instance, req, resp), format_, buffer_size)
+
+    return handler
+
+
+def resolve_streaming_handlers(
+    cls: Any, handlers: Dict[str, ExecuteHandler]
+) -> Dict[str, ExecuteHandler]:
+    """
+    Adapt the async generator handlers of a dispatch table, see Base.stream_format
+    :param cls: class (or subclass) of OpenService
+    :param handlers: {on_method: execute_on_method}, see utils.resolve_execute_handlers
+    :return: dispatch table
+    """
+    return {
+        method: (
+            streaming_handler(
+                handler, cls.stream_format, cls.stream_buffer_size  # type: ignore
+            )
+            if method != "on_request"
+            and inspect.isasyncgenfunction(getattr(cls, f"execute_{method}"))
+            else handler
+        )
+        for method, handler in handlers.items()
+    }
@@ -0,0 +1,76 @@
+__author__ = "icleary"
+
+import base64
+import binascii
+import hashlib
+import hmac
+import time
+from typing import Callable, Optional, Union
+
+# response header a session token is issued in, after a successful login
+SESSION_TOKEN_HEADER = "X-Session-Token"
+
+# authorization header scheme a session token is sent back with
+BEARER_PREFIX = "Bearer "
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class TokenSigner(object):
+    """
+    Stateless, HMAC signed session tokens
+        - a token carries a username and an expiry, verified without the user store
+        - tokens can't be revoked before they expire, keep the ttl short
+        - every worker verifying tokens needs the same secret
+        - set as a class attribute on an AuthService to opt in, e.g.
+            session_tokens = TokenSigner(secret=os.environ["SESSION_SECRET"], ttl=900)
+    """
+
+    def __init__(
+        self,
+        secret: Union[str, bytes],
+        ttl: float = 900,
+        timer: Callable[[], float] = time.time,
+    ) -> None:
+        self.secret = secret.encode("utf-8") if isinstance(secret, str) else secret
+        self.ttl = ttl
+        self.timer = timer
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()
+
+    def issue(self, username: str) -> str:
+        """
+        :param username: username of a successfully authenticated user
+        :return: token, {payload}.{signature}
+        """
+        expires_at = int(self.timer() + self.ttl)
+        payload = f"{expires_at}:{username}".encode("utf-8")
+        return f"{_b64encode(payload)}.{_b64encode(self._sign(payload))}"
+
+    def verify(self, token: str) -> Optional[str]:
+        """
+        :param token: token from issue()
+        :return: username, or None if the token is forged, malformed or expired
+        """
+        try:
+            encoded_payload, encoded_signature = token.split(".")
+            payload = _b64decode(encoded_payload)
+            signature = _b64decode(encoded_signature)
+        except (ValueError, binascii.Error):
+            return None
+
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+
+        expires_at, username = payload.decode("utf-8").split(":", 1)
+        if int(expires_at) <= self.timer():
+            return None
+
+        return username
@@ -1,9 +1,30 @@
 __author__ = "icleary"
 
 import base64
+import binascii
+import functools
+import inspect
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
 
 import responder
 
+# execute_on_{method} handlers, normalized to handler(instance, req, resp)
+ExecuteHandler = Callable[
+    [Any, responder.models.Request, responder.models.Response], Awaitable[None]
+]
+
+# execute_on_{method} handlers are named after the responder hook, e.g.
+# execute_on_get or execute_on_options, any on_{method} may dispatch to one
+EXECUTE_HANDLER_PREFIX = "execute_on_"
+
+
+def not_implemented_reasons(method: str) -> Tuple[str, ...]:
+    """
+    :param method: responder hook, e.g. "on_options"
+    :return: failure reasons of an unimplemented execute_on_{method}, see responses
+    """
+    return (f"execute_{method} not implemented for this URL path",)
+
 
 def update_reason(resp: responder.models.Response, reason: str) -> None:
     """
@@ -18,31 +39,100 @@ def update_reason(resp: responder.models.Response, reason: str) -> None:
         resp.media.update({"reason": reason + "; " + resp.media["reason"]})
 
 
-def assign_credentials_from_base64(
-    req: responder.models.Request
-) -> responder.models.Request:
-    # insert functions to convert and assign to username and password
+class Credentials(NamedTuple):
+    """Username and password of a request, see state.RequestState.credentials"""
 
-    credentials = req.headers["authorization"]
+    username: str
+    password: str
 
+
+# number of distinct authorization headers parse_basic_authorization remembers
+BASIC_AUTHORIZATION_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=BASIC_AUTHORIZATION_CACHE_SIZE)
+def parse_basic_authorization(authorization: str) -> Optional[Credentials]:
+    """
+    Parse an HTTP basic authorization header, memoized as clients resend
+    the same header on every request
+    :param authorization: header value, "Basic {base64 of username:password}"
+    :return: credentials, or None if the header is malformed
+    """
     # separate to get encoded credentials
-    (basic, encoded_credentials) = credentials.split(" ")
+    scheme, _, encoded_credentials = authorization.partition(" ")
+    if scheme.lower() != "basic":
+        return None
 
-    # decode to byte string
-    decoded_credentials = base64.b64decode(encoded_credentials)
+    try:
+        # decode to byte string, then convert byte string to string
+        credentials_string = base64.b64decode(
+            encoded_credentials.strip(), validate=True
+        ).decode("utf-8")
+    except (binascii.Error, UnicodeDecodeError):
+        return None
 
-    # convert byte string to string
-    credentials_string = decoded_credentials.decode("utf-8")
+    username, separator, password = credentials_string.partition(":")
+    if not separator:
+        return None
 
-    # print(decoded_credentials)
+    return Credentials(username, password)
 
-    (username, password) = credentials_string.split(":")
+
+def assign_credentials_from_base64(
+    req: responder.models.Request,
+) -> responder.models.Request:
+    """
+    Kept for backwards compatibility, the request pipeline no longer mutates headers
+    and keeps parse_basic_authorization's result in state.RequestState.credentials
+    :param req: Mutable request object
+    :return: req, with username and password headers
+    """
+    credentials = parse_basic_authorization(req.headers["authorization"])
+    if credentials is None:
+        raise ValueError("authorization header is not valid basic authentication")
 
     # assign credentials to headers, as downstream doesn't handle basic auth
     # this again assumes HTTPS, as custom params or base64 are equivalent to plain text
     # as base64 is reversible
 
-    req.headers["username"] = username
-    req.headers["password"] = password
+    req.headers["username"] = credentials.username
+    req.headers["password"] = credentials.password
 
     return req
+
+
+def resolve_execute_handler(cls: type, name: str) -> Optional[ExecuteHandler]:
+    """
+    Resolve an execute_on_{method} attribute of a class once, so requests only pay
+    for a dict lookup instead of hasattr/getattr/f-string formatting
+    :param cls: class (or subclass) of OpenService
+    :param name: attribute name, e.g. execute_on_get
+    :return: handler(instance, req, resp) or None if the class doesn't implement it
+    """
+    attribute = inspect.getattr_static(cls, name, None)
+
+    if attribute is None:
+        return None
+
+    if inspect.isfunction(attribute):
+        # plain method, bound to the instance at call time
+        return attribute
+
+    # staticmethod, classmethod or other callable, already bound (or unbound) via cls
+    handler = getattr(cls, name)
+    return lambda instance, req, resp: handler(req, resp)
+
+
+def resolve_execute_handlers(cls: type) -> Dict[str, ExecuteHandler]:
+    """
+    Build the {on_method: execute_on_method} dispatch table for a service class
+    :param cls: class (or subclass) of OpenService
+    :return: dictionary of the implemented handlers
+    """
+    handlers: Dict[str, ExecuteHandler] = {}
+    for name in dir(cls):
+        if name.startswith(EXECUTE_HANDLER_PREFIX):
+            handler = resolve_execute_handler(cls, name)
+            if handler is not None:
+                handlers[name[len("execute_") :]] = handler
+    return handlers
@@ -0,0 +1,68 @@
+__author__ = "icleary"
+
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import yaml
+from pydantic import BaseModel, ValidationError
+
+from .encoders import Encoder
+
+INVALID_BODY = "request body is invalid"
+
+# responder hooks whose request body may be validated, by {verb}_model
+BODY_MODEL_METHODS = ("on_post", "on_put", "on_patch")
+
+# errors of a body that couldn't be decoded at all
+UNDECODABLE_BODY_ERRORS = [
+    {"loc": ["body"], "msg": "body could not be decoded", "type": "value_error.decode"}
+]
+
+
+def body_models_for(cls: type) -> Dict[str, Type[BaseModel]]:
+    """
+    Collect the body models of a class once, at class creation, see Base.post_model
+    :param cls: class (or subclass) of OpenService
+    :return: {on_method: model} of the verbs with a model
+    """
+    models = {}
+    for method in BODY_MODEL_METHODS:
+        name = f"{method[3:]}_model"
+        model = getattr(cls, name, None)
+        if model is None:
+            continue
+        if not (isinstance(model, type) and issubclass(model, BaseModel)):
+            raise RuntimeError(f"{name} must be a pydantic model")
+        models[method] = model
+    return models
+
+
+def structure_errors(error: ValidationError) -> List[Dict[str, Any]]:
+    """
+    :param error: raised by a pydantic model
+    :return: [{"loc": [...], "msg": ..., "type": ...}], serializable as json and yaml
+    """
+    return [
+        {"loc": list(detail["loc"]), "msg": detail["msg"], "type": detail["type"]}
+        for detail in error.errors()
+    ]
+
+
+def validate_body(
+    model: Type[BaseModel], encoder: Encoder, body: bytes
+) -> Tuple[Optional[BaseModel], List[Dict[str, Any]]]:
+    """
+    Decode and validate a request body
+    :param model: pydantic model of the body
+    :param encoder: decodes the body, picked by its content type
+    :param body: raw request body
+    :return: the parsed model and no errors, or None and the errors
+    """
+    try:
+        data = encoder.decode(body) if body else None
+    except (ValueError, yaml.YAMLError):
+        return None, UNDECODABLE_BODY_ERRORS
+
+    try:
+        return model.parse_obj(data), []
+    except ValidationError as error:
+        return None, structure_errors(error)
@@ -209,3 +209,32 @@ def api():
             return user
 
     return api
+
+
+@pytest.fixture
+def dispatch(api):
+    async def dispatch(
+        service, method="GET", headers=None, path="/", query_string=b""
+    ):
+        """
+        Run a request through service.on_request and on_{method} like responder
+        does, without a server, so tests can run concurrent requests in one loop
+        :return: the response
+        """
+        scope = {
+            "type": "http",
+            "method": method,
+            "path": path,
+            "query_string": query_string,
+            "headers": [
+                (name.lower().encode("latin-1"), value.encode("latin-1"))
+                for name, value in (headers or {}).items()
+            ],
+        }
+        req = responder.models.Request(scope, receive=None, api=api)
+        resp = responder.models.Response(req=req, formats=api.formats)
+        await service.on_request(req, resp)
+        await getattr(service, f"on_{method.lower()}")(req, resp)
+        return resp
+
+    return dispatch
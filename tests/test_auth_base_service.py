@@ -1,10 +1,23 @@
 __author__ = "icleary"
 
 # stdlib imports
+import asyncio
 import base64
+import threading
 
 # package imports
+import pytest
 import responder
+from responder_base_classes.auth_base_service import AuthService
+from responder_base_classes.cache import CredentialCache, NegativeCredentialCache
+from responder_base_classes.circuit import CircuitBreaker
+from responder_base_classes.idempotency import MemoryIdempotencyStore
+from responder_base_classes.models import User
+from responder_base_classes.passwords import hash_password
+from responder_base_classes.ratelimit import RateLimit
+from responder_base_classes.response_cache import ResponseCache
+from responder_base_classes.state import get_request_state
+from responder_base_classes.tokens import SESSION_TOKEN_HEADER, TokenSigner
 
 
 def test_json_content_type_incorrect_credential_format(api):
@@ -291,3 +304,651 @@ def test_undefined_delete_with_auth(api):
         "status": "failure",
         "reason": "execute_on_delete not implemented for this URL path",
     }
+
+
+def test_wrong_password(api):
+    # credentials are checked against get_user before execute_on_{method}
+
+    encoded_credentials = base64.b64encode(b"test_user:wrong_password")
+    encoded_header = "Basic {}".format(encoded_credentials.decode("utf-8"))
+
+    headers = {"Content-Type": "application/json", "authorization": encoded_header}
+
+    r = api.requests.get("/AuthService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_401  # Unauthorized
+
+    assert r.json() == {
+        "status": "failure",
+        "reason": "In on_get function: exiting before running execute_on_get_request; "
+        "Invalid credentials for this request, password is wrong",
+    }
+
+
+def test_async_get_user(api):
+    # an async def get_user is awaited directly
+
+    @api.route("/AsyncGetUserAuthService")
+    class AsyncGetUserAuthService(AuthService):
+        async def get_user(self, req):
+            await asyncio.sleep(0)
+            return User(username="test_user", password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+
+    r = api.requests.get("/AsyncGetUserAuthService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+
+def test_sync_get_user_is_offloaded_to_thread_pool(api):
+    # a def get_user runs in the class's bounded thread pool, not the event loop
+
+    threads = []
+
+    @api.route("/SyncGetUserAuthService")
+    class SyncGetUserAuthService(AuthService):
+        get_user_workers = 2
+
+        def get_user(self, req):
+            threads.append(threading.current_thread().name)
+            return User(username="test_user", password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+
+    r = api.requests.get("/SyncGetUserAuthService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert threads[0].startswith("get_user.2")
+    assert SyncGetUserAuthService.get_user_executor()._max_workers == 2
+
+
+def test_credential_cache(api):
+    # repeated requests with verified credentials skip get_user
+
+    calls = []
+
+    @api.route("/CachedAuthService")
+    class CachedAuthService(AuthService):
+        credential_cache = CredentialCache(ttl=60, maxsize=16)
+
+        async def get_user(self, req):
+            calls.append(req.headers["username"])
+            return User(username="test_user", password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+
+    for _ in range(3):
+        r = api.requests.get("/CachedAuthService", headers=headers)
+        assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+    # a wrong password is never served from the cache
+    headers["password"] = "wrong_password"
+    r = api.requests.get("/CachedAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_401  # Unauthorized
+
+    assert calls == ["test_user", "test_user"]
+    assert CachedAuthService.credential_cache.hits == 2
+
+
+def test_negative_credential_cache(api):
+    # retries of failed credentials are rejected without calling get_user
+
+    calls = []
+
+    @api.route("/NegativeCachedAuthService")
+    class NegativeCachedAuthService(AuthService):
+        negative_credential_cache = NegativeCredentialCache(ttl=5, maxsize=16)
+
+        async def get_user(self, req):
+            calls.append(req.headers["username"])
+            if req.headers["username"] == "test_user":
+                return User(username="test_user", password="test_password")
+            return None
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+    for username, password in [
+        ("unknown_user", "password"),
+        ("unknown_user", "other_password"),
+        ("test_user", "wrong_password"),
+        ("test_user", "wrong_password"),
+    ]:
+        headers = {
+            "Content-Type": "application/json",
+            "username": username,
+            "password": password,
+        }
+        r = api.requests.get("/NegativeCachedAuthService", headers=headers)
+        assert r.status_code == responder.status_codes.HTTP_401  # Unauthorized
+
+    assert calls == ["unknown_user", "test_user"]
+
+    cache = NegativeCachedAuthService.negative_credential_cache
+    assert cache.failures("unknown_user") == 2
+    assert cache.failures("test_user", "wrong_password") == 2
+
+
+def test_coalesce_get_user():
+    # concurrent lookups of one username share a single get_user call
+
+    calls = []
+
+    class CoalescedAuthService(AuthService):
+        coalesce_get_user = True
+
+        async def get_user(self, req):
+            calls.append(req.headers["username"])
+            await asyncio.sleep(0.01)
+            return User(username=req.headers["username"], password="test_password")
+
+    class Request(object):
+        def __init__(self, username):
+            self.headers = {"username": username}
+
+    async def lookups():
+        service = CoalescedAuthService()
+        waiters = [
+            asyncio.ensure_future(service.lookup_user(Request(username), username))
+            for username in ["test_user"] * 10 + ["other_user"]
+        ]
+        # a cancelled waiter doesn't cancel the shared lookup
+        await asyncio.sleep(0)
+        waiters[0].cancel()
+        return await asyncio.gather(*waiters[1:])
+
+    users = asyncio.new_event_loop().run_until_complete(lookups())
+
+    assert [user.username for user in users] == ["test_user"] * 9 + ["other_user"]
+    assert calls == ["test_user", "other_user"]
+    assert CoalescedAuthService._get_user_in_flight == {}
+
+
+def test_get_users_batches_lookups(api):
+    # concurrent lookups are resolved by one get_users call
+
+    batches = []
+
+    class BatchedAuthService(AuthService):
+        def get_users(self, usernames):
+            batches.append(usernames)
+            return {
+                username: User(username=username, password="test_password")
+                for username in usernames
+                if username != "unknown_user"
+            }
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    class Request(object):
+        def __init__(self, username):
+            self.headers = {"username": username}
+
+    async def lookups():
+        service = BatchedAuthService()
+        usernames = ["test_user", "other_user", "test_user", "unknown_user"]
+        return await asyncio.gather(
+            *(
+                service.lookup_user(Request(username), username)
+                for username in usernames
+            )
+        )
+
+    users = asyncio.new_event_loop().run_until_complete(lookups())
+
+    assert [getattr(user, "username", None) for user in users] == [
+        "test_user",
+        "other_user",
+        "test_user",
+        None,
+    ]
+    assert batches == [["test_user", "other_user", "unknown_user"]]
+
+    # and through a request
+    api.add_route("/BatchedAuthService", BatchedAuthService)
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+    r = api.requests.get("/BatchedAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+
+@pytest.mark.parametrize("password_process_pool", [False, True])
+def test_hashed_password(api, password_process_pool):
+    # hashed passwords are verified off the event loop
+
+    stored = hash_password("test_password")
+
+    @api.route("/HashedPasswordAuthService")
+    class HashedPasswordAuthService(AuthService):
+        password_workers = 1
+
+        def get_user(self, req):
+            return User(username="test_user", password=stored)
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    HashedPasswordAuthService.password_process_pool = password_process_pool
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+
+    r = api.requests.get("/HashedPasswordAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+    headers["password"] = "wrong_password"
+    r = api.requests.get("/HashedPasswordAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_401  # Unauthorized
+
+
+def test_shared_executors():
+    # routes with the same configuration share pools, instead of one pool per route
+
+    class FirstAuthService(AuthService):
+        password_process_pool = True
+
+    class SecondAuthService(AuthService):
+        password_process_pool = True
+
+    class OwnPoolAuthService(FirstAuthService):
+        password_workers = 3
+        get_user_workers = 1
+
+    assert FirstAuthService.password_executor() is SecondAuthService.password_executor()
+    assert FirstAuthService.get_user_executor() is SecondAuthService.get_user_executor()
+
+    assert (
+        OwnPoolAuthService.password_executor()
+        is not FirstAuthService.password_executor()
+    )
+    assert OwnPoolAuthService.password_executor()._max_workers == 3
+    assert (
+        OwnPoolAuthService.get_user_executor()
+        is not FirstAuthService.get_user_executor()
+    )
+    assert OwnPoolAuthService.get_user_executor()._max_workers == 1
+
+
+def test_session_tokens(api):
+    # a password login issues a token, requests with the token skip get_user
+
+    calls = []
+
+    @api.route("/SessionTokenAuthService")
+    class SessionTokenAuthService(AuthService):
+        session_tokens = TokenSigner(secret="secret", ttl=60)
+
+        def get_user(self, req):
+            calls.append(req.headers["username"])
+            return User(username="test_user", password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return user.username == "test_user"
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+    r = api.requests.get("/SessionTokenAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+    token = r.headers[SESSION_TOKEN_HEADER]
+    headers = {"Content-Type": "application/json", "authorization": f"Bearer {token}"}
+    for _ in range(3):
+        r = api.requests.get("/SessionTokenAuthService", headers=headers)
+        assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+    assert calls == ["test_user"]
+
+    headers["authorization"] = f"Bearer {token}tampered"
+    r = api.requests.get("/SessionTokenAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_401  # Unauthorized
+
+
+def test_session_token_not_issued_when_route_rejects(api):
+    # valid credentials the route rejects don't get a session token
+
+    @api.route("/RejectingSessionTokenAuthService")
+    class RejectingSessionTokenAuthService(AuthService):
+        session_tokens = TokenSigner(secret="secret", ttl=60)
+
+        def get_user(self, req):
+            return User(username="test_user", password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return False
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+    r = api.requests.get("/RejectingSessionTokenAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_401  # Unauthorized
+    assert SESSION_TOKEN_HEADER not in r.headers
+
+
+def test_basic_auth_does_not_mutate_request_headers(api):
+    # parsed basic credentials are kept on the request state, not in req.headers
+
+    seen = []
+
+    @api.route("/BasicAuthService")
+    class BasicAuthService(AuthService):
+        def get_user(self, req):
+            seen.append(("username" in req.headers, get_request_state(req).credentials))
+            return User(username="test_user", password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    encoded_credentials = base64.b64encode(b"test_user:test_password")
+    encoded_header = "Basic {}".format(encoded_credentials.decode("utf-8"))
+    headers = {"Content-Type": "application/json", "authorization": encoded_header}
+
+    r = api.requests.get("/BasicAuthService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert seen == [(False, ("test_user", "test_password"))]
+
+
+def test_malformed_basic_auth(api):
+    headers = {"Content-Type": "application/json", "authorization": "Basic !!!"}
+
+    r = api.requests.get("/AuthService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_400  # bad request
+
+
+def test_rate_limit(api):
+    # a client over its rate limit is rejected before get_user is called
+
+    calls = []
+
+    @api.route("/RateLimitedAuthService")
+    class RateLimitedAuthService(AuthService):
+        rate_limits = [RateLimit(2, per=60, key="username")]
+
+        async def get_user(self, req):
+            calls.append(req.headers["username"])
+            return User(username="test_user", password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.status_code = 200  # OK
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+    for _ in range(2):
+        r = api.requests.get("/RateLimitedAuthService", headers=headers)
+        assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+    r = api.requests.get("/RateLimitedAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_429  # Too Many Requests
+    assert r.headers["Retry-After"] == "30"
+    assert r.json()["reason"].endswith("rate limit exceeded")
+    assert calls == ["test_user", "test_user"]
+
+    # other usernames have their own bucket
+    headers["username"] = "other_user"
+    r = api.requests.get("/RateLimitedAuthService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+
+def test_get_user_timeout(api):
+    # a hung get_user is cancelled once the request's deadline passes
+
+    @api.route("/HungAuthService")
+    class HungAuthService(AuthService):
+        timeout = 0.05
+
+        async def get_user(self, req):
+            await asyncio.sleep(1)
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+    headers = {
+        "Content-Type": "application/json",
+        "username": "test_user",
+        "password": "test_password",
+    }
+    r = api.requests.get("/HungAuthService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_504  # Gateway Timeout
+    assert r.json()["reason"] == (
+        "In on_get function: exiting before running execute_on_get_request; "
+        "deadline exceeded in on_request"
+    )
+
+
+def test_user_store_breaker(api):
+    # once get_user keeps failing, requests fail fast with 503,
+    # credentials already in the credential cache keep working
+
+    calls = []
+
+    @api.route("/BrokenStoreAuthService")
+    class BrokenStoreAuthService(AuthService):
+        credential_cache = CredentialCache(ttl=60, maxsize=16)
+        user_store_breaker = CircuitBreaker(
+            failure_threshold=1, window_size=2, minimum_calls=2
+        )
+
+        async def get_user(self, req):
+            calls.append(req.headers["username"])
+            if req.headers["username"] == "test_user":
+                return User(username="test_user", password="test_password")
+            raise ConnectionError("user store is down")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.status_code = 200  # OK
+
+    def get(username):
+        headers = {
+            "Content-Type": "application/json",
+            "username": username,
+            "password": "test_password",
+        }
+        return api.requests.get("/BrokenStoreAuthService", headers=headers)
+
+    assert get("test_user").status_code == responder.status_codes.HTTP_200  # OK
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            get("other_user")
+
+    r = get("other_user")
+    assert r.status_code == responder.status_codes.HTTP_503  # Service Unavailable
+    assert r.json()["reason"].endswith("user store is unavailable, try again later")
+
+    assert get("test_user").status_code == responder.status_codes.HTTP_200  # OK
+    assert calls == ["test_user", "other_user", "other_user"]
+
+
+def test_response_cache_per_user(api):
+    # cached responses are only served to the user they were rendered for
+
+    calls = []
+
+    @api.route("/CachedAuthService")
+    class CachedAuthService(AuthService):
+        response_cache = ResponseCache(ttl=60, maxsize=16)
+
+        async def get_user(self, req):
+            username = get_request_state(req).credentials.username
+            return User(username=username, password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            username = get_request_state(req).user.username
+            calls.append(username)
+            resp.media = {"status": "success", "username": username}
+            resp.status_code = 200  # OK
+
+    def get(username, password="test_password"):
+        headers = {
+            "Content-Type": "application/json",
+            "username": username,
+            "password": password,
+        }
+        return api.requests.get("/CachedAuthService", headers=headers)
+
+    for username in ["test_user", "other_user", "test_user", "other_user"]:
+        r = get(username)
+        assert r.status_code == responder.status_codes.HTTP_200  # OK
+        assert r.json()["username"] == username
+
+    assert calls == ["test_user", "other_user"]
+
+    # credentials are still checked
+    r = get("test_user", "wrong_password")
+    assert r.status_code == responder.status_codes.HTTP_401  # Unauthorized
+
+
+def test_response_cache_does_not_share_session_tokens(api):
+    # a shared cached response keeps each request's own session token
+
+    signer = TokenSigner(secret="secret", ttl=60)
+
+    @api.route("/SharedCacheAuthService")
+    class SharedCacheAuthService(AuthService):
+        response_cache = ResponseCache(ttl=60, maxsize=16, per_user=False)
+        session_tokens = signer
+
+        async def get_user(self, req):
+            username = get_request_state(req).credentials.username
+            return User(username=username, password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.headers["X-Handler"] = "42"
+            resp.media = {"status": "success"}
+            resp.status_code = 200  # OK
+
+    for username in ["alice", "bob"]:
+        headers = {
+            "Content-Type": "application/json",
+            "username": username,
+            "password": "test_password",
+        }
+        r = api.requests.get("/SharedCacheAuthService", headers=headers)
+        assert r.status_code == responder.status_codes.HTTP_200  # OK
+        assert signer.verify(r.headers[SESSION_TOKEN_HEADER]) == username
+        # headers the handler set are cached
+        assert r.headers["X-Handler"] == "42"
+
+
+def test_idempotency_key_per_user(api):
+    # idempotency keys are scoped to the authenticated user
+
+    calls = []
+
+    @api.route("/IdempotentAuthService")
+    class IdempotentAuthService(AuthService):
+        idempotency_store = MemoryIdempotencyStore(ttl=60, maxsize=16)
+
+        async def get_user(self, req):
+            username = get_request_state(req).credentials.username
+            return User(username=username, password="test_password")
+
+        def valid_credentials_for_route(self, req, user):
+            return True
+
+        @staticmethod
+        async def execute_on_post(req, resp):
+            calls.append(get_request_state(req).user.username)
+            resp.status_code = 201  # Created
+
+    for username in ["test_user", "other_user", "test_user"]:
+        headers = {
+            "Content-Type": "application/json",
+            "username": username,
+            "password": "test_password",
+            "Idempotency-Key": "a",
+        }
+        r = api.requests.post("/IdempotentAuthService", headers=headers)
+        assert r.status_code == responder.status_codes.HTTP_201  # Created
+
+    assert calls == ["test_user", "other_user"]
@@ -0,0 +1,63 @@
+# stdlib imports
+import asyncio
+
+# package imports
+import pytest
+from responder_base_classes.batch import BatchLoader
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def test_loads_in_the_same_tick_are_batched():
+    batches = []
+
+    async def load_many(keys):
+        batches.append(keys)
+        return {key: key.upper() for key in keys if key != "missing"}
+
+    loader = BatchLoader(load_many)
+
+    async def loads():
+        return await asyncio.gather(
+            *(loader.load(key) for key in ["a", "b", "a", "missing"])
+        )
+
+    assert run(loads()) == ["A", "B", "A", None]
+    assert batches == [["a", "b", "missing"]]
+
+
+def test_max_batch_size():
+    batches = []
+
+    async def load_many(keys):
+        batches.append(keys)
+        return {key: key for key in keys}
+
+    loader = BatchLoader(load_many, max_batch_size=2)
+
+    async def loads():
+        return await asyncio.gather(*(loader.load(key) for key in range(5)))
+
+    assert run(loads()) == [0, 1, 2, 3, 4]
+    assert batches == [[0, 1], [2, 3], [4]]
+    assert loader.batches == 3
+
+
+def test_load_many_exception_is_raised_by_every_load():
+    async def load_many(keys):
+        raise ValueError("backend is down")
+
+    loader = BatchLoader(load_many, max_wait=0.001)
+
+    async def loads():
+        return await asyncio.gather(
+            loader.load("a"), loader.load("b"), return_exceptions=True
+        )
+
+    errors = run(loads())
+    assert [type(error) for error in errors] == [ValueError, ValueError]
+
+    with pytest.raises(ValueError):
+        run(loader.load("a"))
@@ -0,0 +1,70 @@
+# stdlib imports
+import asyncio
+
+# 3rd party imports
+import pytest
+
+# package imports
+from responder_base_classes.bodies import (
+    RequestBodyTooLarge,
+    content_length,
+    iter_records,
+    read_body,
+)
+
+
+class FakeStarletteRequest(object):
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+        yield b""
+
+
+class FakeRequest(object):
+    def __init__(self, chunks=(), headers=None):
+        self._starlette = FakeStarletteRequest(chunks)
+        self.headers = headers or {}
+
+
+async def collect(records):
+    return [record async for record in records]
+
+
+def test_content_length():
+    assert content_length(FakeRequest(headers={"content-length": "12"})) == 12
+    assert content_length(FakeRequest()) is None
+
+    for value in ("x", "-1"):
+        with pytest.raises(ValueError):
+            content_length(FakeRequest(headers={"content-length": value}))
+
+
+def test_read_body():
+    req = FakeRequest([b"abc", b"def"])
+    assert asyncio.run(read_body(req)) == b"abcdef"
+
+    req = FakeRequest([b"abc", b"def"])
+    assert asyncio.run(read_body(req, max_body_size=6)) == b"abcdef"
+
+    req = FakeRequest([b"abc", b"def"])
+    with pytest.raises(RequestBodyTooLarge):
+        asyncio.run(read_body(req, max_body_size=5))
+
+
+def test_iter_records():
+    # records may be split across chunks, blank lines are skipped
+    req = FakeRequest([b'{"a": 1}\n{"a"', b": 2}\n\n", b'{"a": 3}'])
+
+    records = asyncio.run(collect(iter_records(req)))
+
+    assert records == [{"a": 1}, {"a": 2}, {"a": 3}]
+
+
+def test_iter_records_invalid():
+    req = FakeRequest([b'{"a": 1}\nnot json\n'])
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect(iter_records(req)))
@@ -0,0 +1,82 @@
+# package imports
+from responder_base_classes.cache import (
+    CredentialCache,
+    NegativeCredentialCache,
+    TTLCache,
+)
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_expiry():
+    timer = FakeTimer()
+    cache = TTLCache(ttl=10, timer=timer)
+
+    cache.set("key", "value")
+    assert cache.get("key") == "value"
+
+    timer.now = 10
+    assert cache.get("key") is None
+    assert len(cache) == 0
+
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru_eviction():
+    cache = TTLCache(ttl=10, maxsize=2)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # b is now least recently used
+    cache.set("c", 3)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_credential_cache_does_not_store_plaintext():
+    cache = CredentialCache(ttl=10)
+
+    cache.store("test_user", "test_password", "user")
+
+    assert cache.lookup("test_user", "test_password") == "user"
+    assert cache.lookup("test_user", "wrong_password") is None
+    assert all(b"test_password" not in key for key in cache._data)
+
+
+def test_credential_cache_invalidate():
+    cache = CredentialCache(ttl=10)
+
+    cache.store("test_user", "old_password", "user")
+    cache.store("test_user", "new_password", "user")
+    cache.store("other_user", "password", "other")
+
+    cache.invalidate("test_user", "old_password")
+    assert cache.lookup("test_user", "old_password") is None
+    assert cache.lookup("test_user", "new_password") == "user"
+
+    cache.invalidate("test_user")
+    assert cache.lookup("test_user", "new_password") is None
+    assert cache.lookup("other_user", "password") == "other"
+
+
+def test_negative_credential_cache():
+    cache = NegativeCredentialCache(ttl=5)
+
+    cache.store_unknown_user("unknown_user", "user doesn't exist")
+    cache.store_wrong_password("test_user", "wrong_password", "password is wrong")
+
+    assert cache.lookup("unknown_user", "any_password") == "user doesn't exist"
+    assert cache.lookup("test_user", "wrong_password") == "password is wrong"
+    assert cache.lookup("test_user", "test_password") is None
+
+    assert cache.failures("unknown_user") == 2
+    assert cache.failures("test_user", "wrong_password") == 2
+    assert cache.failures("test_user", "test_password") == 0
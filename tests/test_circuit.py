@@ -0,0 +1,63 @@
+# package imports
+from responder_base_classes.circuit import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_opens_on_failure_rate():
+    breaker = CircuitBreaker(
+        failure_threshold=0.5, window_size=4, minimum_calls=4, timer=FakeTimer()
+    )
+
+    for succeeded in [True, False, True]:
+        assert breaker.allow()
+        breaker.record(succeeded)
+    assert breaker.state == CLOSED
+
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(slow_call_duration=1, window_size=2, minimum_calls=2)
+
+    breaker.record(True, duration=0.1)
+    breaker.record(True, duration=2)
+    assert breaker.failure_rate == 0.5
+    assert breaker.state == OPEN
+
+
+def test_half_open_probing():
+    timer = FakeTimer()
+    breaker = CircuitBreaker(
+        window_size=1, minimum_calls=1, reset_timeout=10, timer=timer
+    )
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    # a single probe after reset_timeout
+    timer.now = 10
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+    # a failed probe opens the circuit again
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    # a successful probe closes it
+    timer.now = 20
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.failure_rate == 0
@@ -0,0 +1,49 @@
+# stdlib imports
+import asyncio
+
+# package imports
+from responder_base_classes.concurrency import ConcurrencyLimiter
+
+
+def run(coroutine):
+    return asyncio.new_event_loop().run_until_complete(coroutine)
+
+
+def test_limiter_rejects_beyond_queue():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_in_flight=1, max_queued=1)
+
+        assert await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 1
+
+        # the queue is full
+        assert not await limiter.acquire()
+        assert limiter.rejected == 1
+
+        # the released slot is handed to the waiter
+        limiter.release()
+        assert await waiter
+        assert (limiter.in_flight, limiter.queue_depth) == (1, 0)
+
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    run(scenario())
+
+
+def test_limiter_queue_timeout():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_in_flight=1, max_queued=1, queue_timeout=0.01)
+
+        assert await limiter.acquire()
+        assert not await limiter.acquire()
+        assert (limiter.queue_depth, limiter.rejected) == (0, 1)
+
+        # the timed out waiter is skipped
+        limiter.release()
+        assert limiter.in_flight == 0
+        assert await limiter.acquire()
+
+    run(scenario())
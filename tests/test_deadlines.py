@@ -0,0 +1,26 @@
+# package imports
+from responder_base_classes.deadlines import parse_timeout
+from responder_base_classes.state import RequestState
+
+
+def test_parse_timeout():
+    assert parse_timeout("2.5") == 2.5
+    assert parse_timeout("0") is None
+    assert parse_timeout("-1") is None
+    assert parse_timeout(None) is None
+    assert parse_timeout("soon") is None
+    assert parse_timeout("inf") is None
+
+
+def test_time_remaining():
+    state = RequestState()
+    assert state.time_remaining() is None
+    assert not state.deadline_exceeded()
+
+    state.start_deadline(60)
+    assert 0 < state.time_remaining() <= 60
+    assert not state.deadline_exceeded()
+
+    state.start_deadline(-1)
+    assert state.time_remaining() == 0
+    assert state.deadline_exceeded()
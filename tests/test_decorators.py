@@ -0,0 +1,62 @@
+# stdlib imports
+import asyncio
+
+# package imports
+import pytest
+from responder_base_classes.decorators import (
+    execute_on_method_if_allowed_to_execute_method,
+    valid_content_type,
+    valid_credential_format,
+    valid_credentials,
+)
+
+
+@pytest.mark.parametrize(
+    "decorator",
+    [
+        valid_content_type,
+        valid_credential_format,
+        valid_credentials,
+        execute_on_method_if_allowed_to_execute_method,
+    ],
+)
+def test_decorator_placement_is_validated_at_class_creation(decorator):
+    # misplaced decorators fail when the class body is evaluated, not per request
+
+    with pytest.raises(RuntimeError):
+
+        class StaticMethodService(object):
+            @decorator
+            @staticmethod
+            async def on_get(req, resp):
+                pass
+
+    with pytest.raises(RuntimeError):
+
+        class SyncMethodService(object):
+            @decorator
+            def on_get(self, req, resp):
+                pass
+
+    with pytest.raises(RuntimeError):
+
+        @decorator
+        class DecoratedClass(object):
+            pass
+
+
+def test_stacked_decorators_compile_to_one_pipeline():
+    # stacked checks are flattened into a single coroutine, run top to bottom
+
+    async def on_request(self, req, resp):
+        pass
+
+    pipeline = valid_content_type(valid_credential_format(on_request))
+
+    assert asyncio.iscoroutinefunction(pipeline)
+    assert pipeline.__name__ == "on_request"
+    assert pipeline.__pipeline_func__ is on_request
+    assert [check.__name__ for check in pipeline.__pipeline_checks__] == [
+        "check_content_type",
+        "check_credential_format",
+    ]
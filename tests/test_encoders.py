@@ -0,0 +1,63 @@
+# stdlib imports
+import json
+
+# 3rd party imports
+import pytest
+import yaml
+
+# package imports
+from responder_base_classes.encoders import JSON, YAML, Encoder, Encoders, encoders_for
+
+
+def test_negotiate():
+    encoders = Encoders([JSON, YAML])
+
+    assert encoders.negotiate(None) is JSON
+    assert encoders.negotiate("*/*") is JSON
+    assert encoders.negotiate("application/x-yaml") is YAML
+    assert encoders.negotiate("yaml") is YAML
+    assert encoders.negotiate("text/yaml, */*;q=0.1") is YAML
+    assert encoders.negotiate("application/json;q=0.5, text/yaml") is YAML
+    assert encoders.negotiate("application/vnd.api+json") is JSON
+    assert encoders.negotiate("text/html") is JSON
+
+
+def test_for_content_type():
+    encoders = Encoders([JSON, YAML])
+
+    assert encoders.for_content_type("application/json; charset=utf-8") is JSON
+    assert encoders.for_content_type("application/x-yaml") is YAML
+    assert encoders.for_content_type("text/html") is None
+    assert encoders.for_content_type(None) is None
+
+
+def test_encode():
+    media = {"status": "success", 1: [1.5, None]}
+
+    assert json.loads(JSON.encode(media)) == {"status": "success", "1": [1.5, None]}
+    assert JSON.decode(JSON.encode({"a": 1})) == {"a": 1}
+    assert yaml.safe_load(YAML.encode(media)) == media
+
+
+def test_encoders_for():
+    encoders = encoders_for(["yaml", "json", "html"])
+
+    assert encoders is not None
+    assert encoders.encoders == (YAML, JSON)
+    assert encoders_for(["html"]) is None
+
+
+def test_msgpack():
+    msgpack = pytest.importorskip("msgpack")
+    encoders = encoders_for(["json", "msgpack"])
+
+    assert encoders is not None
+    encoder = encoders.negotiate("application/msgpack")
+    assert msgpack.unpackb(encoder.encode({"a": 1})) == {"a": 1}
+
+
+def test_custom_encoder():
+    csv = Encoder("csv", "text/csv", lambda media: b"a,b", lambda body: body)
+    encoders = Encoders([JSON, csv])
+
+    assert encoders.negotiate("text/csv") is csv
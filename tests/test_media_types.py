@@ -0,0 +1,50 @@
+# package imports
+import pytest
+from responder_base_classes.media_types import ContentTypeMatcher, parse_media_type
+
+
+def test_parse_media_type():
+    assert parse_media_type("Application/JSON; charset=utf-8") == (
+        "application",
+        "json",
+    )
+    assert parse_media_type("json") is None
+    assert parse_media_type("/json") is None
+
+
+@pytest.mark.parametrize(
+    "content_type, allowed",
+    [
+        ("application/json", True),
+        ("application/json; charset=utf-8", True),
+        ("application/vnd.api+json", True),
+        ("text/yaml", True),
+        ("application/x-yaml", True),
+        ("application/xml", False),
+        ("text/plain; format=json", False),
+        ("application/jsonp", False),
+        ("json", False),
+        (None, False),
+    ],
+)
+def test_format_matching(content_type, allowed):
+    matcher = ContentTypeMatcher(["json", "yaml"])
+
+    assert matcher(content_type) is allowed
+
+
+def test_media_type_matching():
+    matcher = ContentTypeMatcher(["application/json", "text/*"])
+
+    assert matcher("application/json")
+    assert matcher("text/csv")
+    assert not matcher("application/vnd.api+json")
+
+
+def test_verdicts_are_cached():
+    matcher = ContentTypeMatcher(["json"])
+
+    matcher("application/json")
+    matcher("application/json")
+
+    assert matcher.matches.cache_info().hits == 1
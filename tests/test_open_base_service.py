@@ -1,6 +1,21 @@
+# stdlib imports
+import asyncio
+import json
+
 # package imports
+import pytest
 import responder
 import yaml
+from pydantic import BaseModel
+
+from responder_base_classes.bodies import read_body
+from responder_base_classes.decorators import (
+    execute_on_method_if_allowed_to_execute_method,
+)
+from responder_base_classes.idempotency import MemoryIdempotencyStore
+from responder_base_classes.open_base_service import OpenService
+from responder_base_classes.response_cache import ResponseCache
+from responder_base_classes.state import get_request_state
 
 
 def test_incorrect_content_type(api):
@@ -218,3 +233,599 @@ def test_undefined_delete(api):
         "status": "failure",
         "reason": "execute_on_delete not implemented for this URL path",
     }
+
+
+def test_execute_handlers_resolved_at_class_creation(api):
+    # instance methods and classmethods are dispatched as well as staticmethods
+
+    @api.route("/BoundOpenService")
+    class BoundOpenService(OpenService):
+        async def execute_on_get(self, req, resp):
+            resp.media = {"status": "success", "reason": type(self).__name__}
+            resp.status_code = 200  # OK
+
+        @classmethod
+        async def execute_on_post(cls, req, resp):
+            resp.media = {"status": "success", "reason": cls.__name__}
+            resp.status_code = 200  # OK
+
+    assert set(BoundOpenService._execute_handlers) == {"on_get", "on_post"}
+
+    headers = {"Content-Type": "application/json"}
+
+    r = api.requests.get("/BoundOpenService", headers=headers)
+    assert r.json() == {"status": "success", "reason": "BoundOpenService"}
+
+    r = api.requests.post("/BoundOpenService", headers=headers)
+    assert r.json() == {"status": "success", "reason": "BoundOpenService"}
+
+
+def test_custom_method(api):
+    # any on_{method} may dispatch to an execute_on_{method}
+
+    @api.route("/OptionsOpenService")
+    class OptionsOpenService(OpenService):
+        @execute_on_method_if_allowed_to_execute_method
+        async def on_options(self, req, resp):
+            pass
+
+        @staticmethod
+        async def execute_on_options(req, resp):
+            resp.headers["Allow"] = "GET, OPTIONS"
+            resp.status_code = 204  # No Content
+
+    @api.route("/UnimplementedOptionsOpenService")
+    class UnimplementedOptionsOpenService(OpenService):
+        @execute_on_method_if_allowed_to_execute_method
+        async def on_options(self, req, resp):
+            pass
+
+    headers = {"Content-Type": "application/json"}
+
+    r = api.requests.options("/OptionsOpenService", headers=headers)
+    assert r.status_code == 204  # No Content
+    assert r.headers["Allow"] == "GET, OPTIONS"
+
+    r = api.requests.options("/UnimplementedOptionsOpenService", headers=headers)
+    assert r.status_code == 501  # Not Implemented
+    assert r.json()["reason"] == "execute_on_options not implemented for this URL path"
+
+
+def test_singleton_instance_is_not_poisoned_by_failed_request(api):
+    # per request state lives on the request, so a routed instance can be reused
+
+    class SingletonOpenService(OpenService):
+        @staticmethod
+        async def execute_on_get(req, resp):
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    api.add_route("/SingletonOpenService", SingletonOpenService())
+
+    r = api.requests.get(
+        "/SingletonOpenService", headers={"Content-Type": "application/xml"}
+    )
+    assert r.status_code == responder.status_codes.HTTP_415  # unsupported media type
+
+    r = api.requests.get(
+        "/SingletonOpenService", headers={"Content-Type": "application/json"}
+    )
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+
+def test_singleton_instance_serves_concurrent_requests(dispatch):
+    # interleaved failing and succeeding requests on one instance
+
+    class ConcurrentOpenService(OpenService):
+        @staticmethod
+        async def execute_on_request(req, resp):
+            await asyncio.sleep(0)
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            await asyncio.sleep(0)
+            resp.media = {"status": "success", "reason": "executed on_get completely"}
+            resp.status_code = 200  # OK
+
+    service = ConcurrentOpenService()
+
+    async def request(content_type):
+        resp = await dispatch(service, headers={"content-type": content_type})
+        return resp.status_code
+
+    async def requests():
+        content_types = ["application/json", "application/xml"] * 50
+        return await asyncio.gather(*(request(c) for c in content_types))
+
+    status_codes = asyncio.new_event_loop().run_until_complete(requests())
+
+    assert status_codes == [200, 415] * 50
+
+
+def test_content_type_with_parameters_and_suffix(api):
+    # media types are parsed, so parameters and +json suffixes are allowed
+
+    for content_type in ["application/json; charset=utf-8", "application/vnd.api+json"]:
+        r = api.requests.get("/OpenService", headers={"Content-Type": content_type})
+        assert r.status_code == responder.status_codes.HTTP_200  # OK
+
+
+def test_max_in_flight_sheds_load(dispatch):
+    # requests beyond max_in_flight and max_queued are rejected with 503
+
+    class LimitedOpenService(OpenService):
+        max_in_flight = 1
+        max_queued = 1
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            await asyncio.sleep(0.01)
+            resp.status_code = 200  # OK
+
+    service = LimitedOpenService()
+
+    async def request():
+        resp = await dispatch(service, headers={"content-type": "application/json"})
+        return resp.status_code
+
+    async def requests():
+        return await asyncio.gather(*(request() for _ in range(3)))
+
+    status_codes = asyncio.new_event_loop().run_until_complete(requests())
+
+    assert sorted(status_codes) == [200, 200, 503]
+    limiter = LimitedOpenService.concurrency_limiter
+    assert (limiter.in_flight, limiter.queue_depth, limiter.rejected) == (0, 0, 1)
+
+
+def test_timeout(api):
+    # handlers that overrun the deadline are cancelled with a 504
+
+    remaining = []
+
+    @api.route("/SlowOpenService")
+    class SlowOpenService(OpenService):
+        timeouts = {"get": 0.05}
+        timeout_header = "X-Request-Timeout"
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            remaining.append(get_request_state(req).time_remaining())
+            await asyncio.sleep(float(req.params.get("sleep", 0)))
+            resp.media = {"status": "success"}
+            resp.status_code = 200  # OK
+
+        @staticmethod
+        async def execute_on_post(req, resp):
+            remaining.append(get_request_state(req).time_remaining())
+            resp.status_code = 200  # OK
+
+    headers = {"Content-Type": "application/json"}
+
+    r = api.requests.get("/SlowOpenService?sleep=1", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_504  # Gateway Timeout
+    assert r.json() == {
+        "status": "failure",
+        "reason": "deadline exceeded in execute_on_get",
+    }
+
+    r = api.requests.get("/SlowOpenService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert 0 < remaining[-1] <= 0.05
+
+    # no timeout for post, unless the client sets one
+    r = api.requests.post("/SlowOpenService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert remaining[-1] is None
+
+    headers["X-Request-Timeout"] = "5"
+    r = api.requests.post("/SlowOpenService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert 0.05 < remaining[-1] <= 5
+
+    # a client can only shorten the class's timeout
+    r = api.requests.get("/SlowOpenService?sleep=0.01", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert remaining[-1] <= 0.05
+
+
+def test_response_cache(api):
+    # cached GET responses skip execute_on_get and carry a strong ETag
+
+    calls = []
+
+    @api.route("/CachedOpenService")
+    class CachedOpenService(OpenService):
+        response_cache = ResponseCache(ttl=60, maxsize=16)
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            calls.append(req.params.get("page"))
+            resp.media = {"status": "success", "page": req.params.get("page")}
+            resp.status_code = 200  # OK
+
+    headers = {"Content-Type": "application/json"}
+
+    r = api.requests.get("/CachedOpenService?page=1", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert r.json() == {"status": "success", "page": "1"}
+    etag = r.headers["ETag"]
+
+    r = api.requests.get("/CachedOpenService?page=1", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert r.json() == {"status": "success", "page": "1"}
+    assert r.headers["ETag"] == etag
+    assert r.headers["Content-Type"] == "application/json"
+    assert calls == ["1"]
+
+    # conditional GET
+    r = api.requests.get(
+        "/CachedOpenService?page=1", headers={**headers, "If-None-Match": etag}
+    )
+    assert r.status_code == 304  # Not Modified
+    assert r.content == b""
+    assert r.headers["ETag"] == etag
+
+    # the query string is part of the key
+    r = api.requests.get("/CachedOpenService?page=2", headers=headers)
+    assert r.json() == {"status": "success", "page": "2"}
+    assert r.headers["ETag"] != etag
+    assert calls == ["1", "2"]
+
+    # failed checks are never served from the cache
+    r = api.requests.get(
+        "/CachedOpenService?page=1", headers={"Content-Type": "application/xml"}
+    )
+    assert r.status_code == responder.status_codes.HTTP_415  # unsupported media type
+
+
+def test_coalesce_get(dispatch):
+    # identical concurrent GETs share one execute_on_get call
+
+    calls = []
+
+    class CoalescedOpenService(OpenService):
+        coalesce_get = True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            calls.append(req.params.get("page"))
+            await asyncio.sleep(0.01)
+            resp.media = {"status": "success", "page": req.params.get("page")}
+            resp.status_code = 200  # OK
+
+    service = CoalescedOpenService()
+
+    async def request(query_string):
+        resp = await dispatch(
+            service,
+            headers={"content-type": "application/json"},
+            query_string=query_string,
+        )
+        return resp.status_code, json.loads(resp.content)
+
+    async def requests():
+        query_strings = [b"page=1"] * 5 + [b"page=2"] * 5
+        return await asyncio.gather(*(request(q) for q in query_strings))
+
+    responses = asyncio.new_event_loop().run_until_complete(requests())
+
+    assert sorted(calls) == ["1", "2"]
+    assert responses[:5] == [(200, {"status": "success", "page": "1"})] * 5
+    assert responses[5:] == [(200, {"status": "success", "page": "2"})] * 5
+    assert CoalescedOpenService._get_in_flight == {}
+
+
+def test_coalesce_get_not_found(dispatch):
+    # followers of a response that can't be shared run concurrently, not queued
+
+    running = []
+    peaks = []
+
+    class NotFoundCoalescedOpenService(OpenService):
+        coalesce_get = True
+
+        @staticmethod
+        async def execute_on_get(req, resp):
+            running.append(req)
+            peaks.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(req)
+            resp.media = {"status": "failure", "reason": "not found"}
+            resp.status_code = 404  # Not Found
+
+    service = NotFoundCoalescedOpenService()
+    headers = {"content-type": "application/json"}
+
+    async def requests():
+        return await asyncio.gather(
+            *(dispatch(service, headers=headers) for _ in range(5))
+        )
+
+    responses = asyncio.new_event_loop().run_until_complete(requests())
+
+    assert [resp.status_code for resp in responses] == [404] * 5
+    # the leader ran alone, then the 4 waiting requests at once
+    assert peaks == [1, 1, 2, 3, 4]
+
+
+def test_head_falls_back_to_get(api):
+    # without execute_on_head, HEAD is answered with the headers of a GET
+
+    calls = []
+
+    @api.route("/HeadOpenService")
+    class HeadOpenService(OpenService):
+        @staticmethod
+        async def execute_on_get(req, resp):
+            calls.append("get")
+            resp.media = {"status": "success", "object": 42}
+            resp.status_code = 200  # OK
+
+    @api.route("/CachedHeadOpenService")
+    class CachedHeadOpenService(HeadOpenService):
+        response_cache = ResponseCache(ttl=60, maxsize=16)
+
+    headers = {"Content-Type": "application/json"}
+    body = api.requests.get("/HeadOpenService", headers=headers).content
+
+    r = api.requests.head("/HeadOpenService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert r.content == b""
+    assert r.headers["Content-Length"] == str(len(body))
+    assert "ETag" in r.headers
+
+    # HEAD and GET share cached responses
+    r = api.requests.head("/CachedHeadOpenService", headers=headers)
+    assert r.headers["Content-Length"] == str(len(body))
+    etag = r.headers["ETag"]
+
+    r = api.requests.get("/CachedHeadOpenService", headers=headers)
+    assert r.content == body
+    assert r.headers["ETag"] == etag
+    assert calls == ["get", "get", "get"]
+
+
+def test_idempotency_key(api, dispatch):
+    # retries with the same Idempotency-Key replay the first response
+
+    calls = []
+
+    class IdempotentOpenService(OpenService):
+        idempotency_store = MemoryIdempotencyStore(ttl=60, maxsize=16)
+
+        @staticmethod
+        async def execute_on_post(req, resp):
+            calls.append(req.headers.get("Idempotency-Key"))
+            await asyncio.sleep(0.01)
+            resp.media = {"status": "success", "order": len(calls)}
+            resp.status_code = 201  # Created
+
+    api.add_route("/IdempotentOpenService", IdempotentOpenService)
+    service = IdempotentOpenService()
+
+    async def request(key):
+        headers = {"content-type": "application/json", "idempotency-key": key}
+        resp = await dispatch(
+            service, "POST", headers=headers, path="/IdempotentOpenService"
+        )
+        return resp.status_code, json.loads(resp.content)
+
+    async def requests():
+        # concurrent duplicates wait for the first execution
+        return await asyncio.gather(*(request("a") for _ in range(5)))
+
+    responses = asyncio.new_event_loop().run_until_complete(requests())
+    assert responses == [(201, {"status": "success", "order": 1})] * 5
+    assert calls == ["a"]
+
+    headers = {"Content-Type": "application/json", "Idempotency-Key": "a"}
+    r = api.requests.post("/IdempotentOpenService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_201  # Created
+    assert r.json() == {"status": "success", "order": 1}
+
+    headers["Idempotency-Key"] = "b"
+    r = api.requests.post("/IdempotentOpenService", headers=headers)
+    assert r.json() == {"status": "success", "order": 2}
+
+    # requests without a key always run
+    del headers["Idempotency-Key"]
+    r = api.requests.post("/IdempotentOpenService", headers=headers)
+    assert r.json() == {"status": "success", "order": 3}
+    assert calls == ["a", "b", None]
+
+
+def test_idempotency_key_server_error(api, dispatch):
+    # duplicates of a request whose response isn't stored retry one at a time
+
+    running = []
+    calls = []
+
+    class FailingIdempotentOpenService(OpenService):
+        idempotency_store = MemoryIdempotencyStore(ttl=60, maxsize=16)
+
+        @staticmethod
+        async def execute_on_post(req, resp):
+            running.append(req)
+            calls.append(len(running))
+            await asyncio.sleep(0.01)
+            running.remove(req)
+            resp.media = {"status": "failure", "reason": "server error"}
+            resp.status_code = 500  # Internal Server Error
+
+    service = FailingIdempotentOpenService()
+    headers = {"content-type": "application/json", "idempotency-key": "a"}
+
+    async def requests():
+        return await asyncio.gather(
+            *(dispatch(service, "POST", headers=headers) for _ in range(5))
+        )
+
+    responses = asyncio.new_event_loop().run_until_complete(requests())
+    assert [resp.status_code for resp in responses] == [500] * 5
+    # 5xx responses aren't stored, each duplicate ran, never two at once
+    assert calls == [1] * 5
+
+
+def test_stream_records(api):
+    # async generator handlers are streamed, after the on_request checks
+
+    @api.route("/StreamingOpenService")
+    class StreamingOpenService(OpenService):
+        stream_buffer_size = 16
+
+        async def execute_on_get(self, req, resp):
+            for row in range(100):
+                yield {"row": row}
+
+    @api.route("/JSONStreamingOpenService")
+    class JSONStreamingOpenService(StreamingOpenService):
+        stream_format = "json"
+
+    headers = {"Content-Type": "application/json"}
+    rows = [{"row": row} for row in range(100)]
+
+    r = api.requests.get("/StreamingOpenService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert r.headers["Content-Type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in r.content.splitlines()] == rows
+
+    r = api.requests.get("/JSONStreamingOpenService", headers=headers)
+    assert r.headers["Content-Type"] == "application/json"
+    assert r.json() == rows
+
+    r = api.requests.head("/StreamingOpenService", headers=headers)
+    assert r.status_code == responder.status_codes.HTTP_200  # OK
+    assert r.content == b""
+
+    r = api.requests.get(
+        "/StreamingOpenService", headers={"Content-Type": "application/xml"}
+    )
+    assert r.status_code == responder.status_codes.HTTP_415  # unsupported media type
+
+
+def test_stream_within_limits(dispatch):
+    # a stream keeps its concurrency slot and deadline until it's sent
+
+    class LimitedStreamingOpenService(OpenService):
+        max_in_flight = 1
+
+        async def execute_on_get(self, req, resp):
+            for row in range(3):
+                await asyncio.sleep(0.01)
+                yield {"row": row}
+
+    class SlowStreamingOpenService(LimitedStreamingOpenService):
+        timeout = 0.02
+
+    async def send(resp):
+        body, _headers = await resp.body
+        return b"".join([chunk async for chunk in body])
+
+    async def requests():
+        headers = {"content-type": "application/json"}
+        service = LimitedStreamingOpenService()
+        limiter = service.concurrency_limiter
+
+        resp = await dispatch(service, headers=headers)
+        assert limiter.in_flight == 1
+        # the pending stream holds the only slot
+        rejected = await dispatch(service, headers=headers)
+        assert rejected.status_code == 503  # Service Unavailable
+        assert len((await send(resp)).splitlines()) == 3
+        assert limiter.in_flight == 0
+
+        service = SlowStreamingOpenService()
+        resp = await dispatch(service, headers=headers)
+        with pytest.raises(asyncio.TimeoutError):
+            await send(resp)
+        assert service.concurrency_limiter.in_flight == 0
+
+    asyncio.new_event_loop().run_until_complete(requests())
+
+
+def test_max_body_size(api):
+    # bodies larger than max_body_size are rejected with 413
+
+    calls = []
+
+    @api.route("/IngestOpenService")
+    class IngestOpenService(OpenService):
+        max_body_size = 64
+
+        async def execute_on_post(self, req, resp):
+            calls.append("post")
+            records = [record async for record in self.iter_records(req)]
+            resp.media = {"status": "success", "records": len(records)}
+            resp.status_code = 201  # Created
+
+    headers = {"Content-Type": "application/json"}
+
+    r = api.requests.post("/IngestOpenService", headers=headers, data=b'{"a": 1}\n' * 3)
+    assert r.status_code == responder.status_codes.HTTP_201  # Created
+    assert r.json() == {"status": "success", "records": 3}
+
+    # declared too large, rejected before execute_on_post reads it
+    r = api.requests.post("/IngestOpenService", headers=headers, data=b"{}\n" * 30)
+    assert r.status_code == responder.status_codes.HTTP_413  # Payload Too Large
+    assert calls == ["post"]
+
+    # a body read past its limit is rejected while execute_on_post reads it
+    @api.route("/ReadingOpenService")
+    class ReadingOpenService(OpenService):
+        async def execute_on_post(self, req, resp):
+            calls.append("post")
+            await read_body(req, max_body_size=8)
+
+    r = api.requests.post("/ReadingOpenService", headers=headers, data=b"{}\n" * 30)
+    assert r.status_code == responder.status_codes.HTTP_413  # Payload Too Large
+    assert calls == ["post", "post"]
+
+
+def test_post_model(api):
+    # bodies are validated by post_model before execute_on_post runs
+
+    class Order(BaseModel):
+        item: str
+        quantity: int
+
+    calls = []
+
+    @api.route("/ValidatingOpenService")
+    class ValidatingOpenService(OpenService):
+        post_model = Order
+
+        async def execute_on_post(self, req, resp):
+            order = get_request_state(req).body
+            calls.append(order)
+            resp.media = {"status": "success", "quantity": order.quantity}
+            resp.status_code = 201  # Created
+
+    headers = {"Content-Type": "application/json"}
+
+    r = api.requests.post(
+        "/ValidatingOpenService", headers=headers, json={"item": "a", "quantity": "2"}
+    )
+    assert r.status_code == responder.status_codes.HTTP_201  # Created
+    assert r.json() == {"status": "success", "quantity": 2}
+    assert calls == [Order(item="a", quantity=2)]
+
+    r = api.requests.post(
+        "/ValidatingOpenService", headers=headers, json={"quantity": "x"}
+    )
+    assert r.status_code == 422  # Unprocessable Entity
+    assert r.json()["reason"] == "request body is invalid"
+    assert [error["loc"] for error in r.json()["errors"]] == [["item"], ["quantity"]]
+
+    r = api.requests.post("/ValidatingOpenService", headers=headers, data=b"{")
+    assert r.status_code == 422  # Unprocessable Entity
+    assert r.json()["errors"][0]["type"] == "value_error.decode"
+
+    # yaml bodies are decoded as yaml
+    r = api.requests.post(
+        "/ValidatingOpenService",
+        headers={"Content-Type": "application/x-yaml"},
+        data=yaml.safe_dump({"item": "b", "quantity": 3}),
+    )
+    assert r.status_code == responder.status_codes.HTTP_201  # Created
+    assert len(calls) == 2
@@ -0,0 +1,60 @@
+# package imports
+import pytest
+from responder_base_classes.passwords import (
+    PBKDF2_SHA256,
+    SCRYPT,
+    VERIFIERS,
+    hash_password,
+    is_hashed,
+    verify_password,
+)
+
+SCHEMES = [PBKDF2_SHA256] + ([SCRYPT] if SCRYPT in VERIFIERS else [])
+
+
+@pytest.mark.parametrize("scheme", SCHEMES)
+def test_hash_and_verify(scheme):
+    stored = hash_password("test_password", scheme)
+
+    assert stored.startswith(scheme + "$")
+    assert "test_password" not in stored
+    assert is_hashed(stored)
+    assert verify_password("test_password", stored)
+    assert not verify_password("wrong_password", stored)
+
+    # salted, so hashing twice gives different hashes
+    assert hash_password("test_password", scheme) != stored
+
+
+def test_plaintext_stored_password():
+    assert not is_hashed("test_password")
+    assert verify_password("test_password", "test_password")
+    assert not verify_password("wrong_password", "test_password")
+
+
+def test_malformed_hash():
+    assert not verify_password("test_password", "pbkdf2_sha256$not$a$hash")
+
+
+def test_unsupported_scheme():
+    with pytest.raises(ValueError):
+        hash_password("test_password", "md5")
+
+
+def test_hash_without_verifier():
+    # a stored hash of an unsupported scheme isn't compared as plaintext
+    stored = "$2b$12$R9h/cIPz0gi.URNNX3kh2OPST9/PgBkqquzi.Ss7KIUgO2t0jWMUW"
+
+    assert is_hashed(stored)
+    assert not verify_password(stored, stored)
+    assert not verify_password("test_password", stored)
+
+
+@pytest.mark.parametrize(
+    "stored", ["$ecret", "scrypt$x", "pbkdf2_sha256$", "$2b$short"]
+)
+def test_plaintext_resembling_hash(stored):
+    # only recognised hash formats are hashes, so these users aren't locked out
+    assert not is_hashed(stored)
+    assert verify_password(stored, stored)
+    assert not verify_password("wrong_password", stored)
@@ -0,0 +1,56 @@
+# stdlib imports
+import asyncio
+
+# package imports
+from responder_base_classes.ratelimit import MemoryRateLimitStore
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def take(store, key, rate=1.0, capacity=2.0):
+    return asyncio.new_event_loop().run_until_complete(store.take(key, rate, capacity))
+
+
+def test_token_bucket():
+    timer = FakeTimer()
+    store = MemoryRateLimitStore(timer=timer)
+
+    # a full bucket allows a burst of capacity requests
+    assert take(store, "client") == 0
+    assert take(store, "client") == 0
+    assert take(store, "client") == 1.0
+
+    # refilled at rate tokens per second
+    timer.now = 0.5
+    assert take(store, "client") == 0.5
+    timer.now = 1.0
+    assert take(store, "client") == 0
+
+    # buckets are independent
+    assert take(store, "other_client") == 0
+
+
+def test_compaction_drops_full_buckets():
+    timer = FakeTimer()
+    store = MemoryRateLimitStore(compact_interval=10, timer=timer)
+
+    take(store, "idle", capacity=2.0)
+    timer.now = 9
+    take(store, "busy", capacity=20.0)
+    assert len(store) == 2
+
+    # idle refilled after 1 second, busy needs until 10 seconds
+    timer.now = 9.5
+    store.compact()
+    assert len(store) == 1
+
+    # compaction runs on take, every compact_interval seconds
+    timer.now = 20
+    take(store, "new")
+    assert len(store) == 1
@@ -0,0 +1,20 @@
+# package imports
+from responder_base_classes.response_cache import compute_etag, etag_matches
+
+
+def test_compute_etag():
+    etag = compute_etag(b"body")
+
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag == compute_etag(b"body")
+    assert etag != compute_etag(b"other body")
+
+
+def test_etag_matches():
+    etag = compute_etag(b"body")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,48 @@
+# stdlib imports
+import json
+
+# package imports
+import responder
+import yaml
+
+from responder_base_classes.responses import encode_failure
+
+
+def test_encode_failure_joins_reasons_newest_first():
+    body = encode_failure(("first", "second"), "json")
+
+    assert json.loads(body) == {"status": "failure", "reason": "second; first"}
+
+
+def test_encode_failure_is_cached():
+    assert encode_failure(("cached",), "json") is encode_failure(("cached",), "json")
+
+
+def test_encode_failure_yaml():
+    body = encode_failure(("reason",), "yaml")
+
+    assert yaml.safe_load(body) == {"status": "failure", "reason": "reason"}
+
+
+def test_rejected_request_body(api):
+    headers = {"content-type": "application/xml"}
+
+    r = api.requests.get("/OpenService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_415  # unsupported media type
+    assert r.headers["content-type"] == "application/json"
+    assert r.json() == {
+        "status": "failure",
+        "reason": "In on_get function: exiting before running execute_on_get_request; "
+        "content-type is not in ['json', 'yaml']",
+    }
+
+
+def test_rejected_request_body_yaml(api):
+    headers = {"content-type": "application/xml", "Accept": "yaml"}
+
+    r = api.requests.get("/OpenService", headers=headers)
+
+    assert r.status_code == responder.status_codes.HTTP_415  # unsupported media type
+    assert r.headers["content-type"] == "application/x-yaml"
+    assert yaml.safe_load(r.content)["status"] == "failure"
@@ -0,0 +1,71 @@
+# stdlib imports
+import asyncio
+import json
+
+# 3rd party imports
+import pytest
+
+# package imports
+from responder_base_classes.concurrency import ConcurrencyLimiter
+from responder_base_classes.streaming import (
+    GuardedStream,
+    json_array_chunks,
+    ndjson_chunks,
+    streaming_handler,
+)
+
+
+async def records(count):
+    for record in range(count):
+        yield {"record": record}
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def test_ndjson_chunks():
+    chunks = asyncio.run(collect(ndjson_chunks(records(3), buffer_size=20)))
+
+    # chunks are sent once buffer_size bytes are buffered
+    assert len(chunks) == 2
+    lines = b"".join(chunks).splitlines()
+    assert [json.loads(line) for line in lines] == [{"record": r} for r in range(3)]
+    assert asyncio.run(collect(ndjson_chunks(records(0)))) == []
+
+
+def test_json_array_chunks():
+    chunks = asyncio.run(collect(json_array_chunks(records(3), buffer_size=20)))
+
+    assert len(chunks) == 2
+    assert json.loads(b"".join(chunks)) == [{"record": r} for r in range(3)]
+    assert asyncio.run(collect(json_array_chunks(records(0)))) == [b"[]"]
+
+
+def test_streaming_handler_format():
+    with pytest.raises(RuntimeError):
+        streaming_handler(lambda instance, req, resp: records(1), "csv")
+
+
+def test_guarded_stream_releases_once():
+    async def acquired_limiter():
+        limiter = ConcurrencyLimiter(1)
+        assert await limiter.acquire()
+        return limiter
+
+    async def chunks():
+        yield b"chunk"
+
+    limiter = asyncio.run(acquired_limiter())
+    stream = GuardedStream(chunks, [limiter])
+    assert asyncio.run(collect(stream())) == [b"chunk"]
+    assert limiter.in_flight == 0
+
+    # a stream dropped before it's sent releases its slot too
+    limiter = asyncio.run(acquired_limiter())
+    stream = GuardedStream(chunks, [limiter])
+    body = stream()
+    del body
+    assert limiter.in_flight == 0
+    stream.release()
+    assert limiter.in_flight == 0
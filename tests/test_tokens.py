@@ -0,0 +1,43 @@
+# package imports
+from responder_base_classes.tokens import TokenSigner
+
+
+class FakeTimer(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_issue_and_verify():
+    signer = TokenSigner(secret="secret", ttl=60)
+
+    token = signer.issue("test_user:with:colons")
+
+    assert signer.verify(token) == "test_user:with:colons"
+
+
+def test_expired_token():
+    timer = FakeTimer()
+    signer = TokenSigner(secret="secret", ttl=60, timer=timer)
+
+    token = signer.issue("test_user")
+    timer.now += 60
+
+    assert signer.verify(token) is None
+
+
+def test_forged_and_malformed_tokens():
+    signer = TokenSigner(secret="secret", ttl=60)
+    other_signer = TokenSigner(secret="other_secret", ttl=60)
+
+    assert signer.verify(other_signer.issue("test_user")) is None
+
+    payload, signature = signer.issue("test_user").split(".")
+    forged_payload = other_signer.issue("admin").split(".")[0]
+    assert signer.verify(f"{forged_payload}.{signature}") is None
+
+    assert signer.verify("not a token") is None
+    assert signer.verify("a.b.c") is None
+    assert signer.verify("!!!.???") is None
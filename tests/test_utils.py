@@ -0,0 +1,39 @@
+# stdlib imports
+import base64
+
+# package imports
+from responder_base_classes.utils import Credentials, parse_basic_authorization
+
+
+def basic(credentials):
+    return "Basic {}".format(base64.b64encode(credentials).decode("utf-8"))
+
+
+def test_parse_basic_authorization():
+    assert parse_basic_authorization(basic(b"test_user:test_password")) == (
+        Credentials("test_user", "test_password")
+    )
+
+    # only the first colon separates username and password
+    assert parse_basic_authorization(basic(b"test_user:pass:word")) == (
+        Credentials("test_user", "pass:word")
+    )
+
+
+def test_parse_basic_authorization_is_memoized():
+    header = basic(b"memoized_user:test_password")
+    hits = parse_basic_authorization.cache_info().hits
+
+    first = parse_basic_authorization(header)
+    second = parse_basic_authorization(header)
+
+    assert first is second
+    assert parse_basic_authorization.cache_info().hits == hits + 1
+
+
+def test_parse_malformed_basic_authorization():
+    assert parse_basic_authorization("Basic") is None
+    assert parse_basic_authorization("Basic not-base64!") is None
+    assert parse_basic_authorization(basic(b"no_colon")) is None
+    assert parse_basic_authorization(basic(b"\xff\xfe:password")) is None
+    assert parse_basic_authorization("Token " + basic(b"a:b")[6:]) is None
@@ -0,0 +1,46 @@
+# 3rd party imports
+import pytest
+from pydantic import BaseModel
+
+# package imports
+from responder_base_classes.encoders import JSON, YAML
+from responder_base_classes.validation import body_models_for, validate_body
+
+
+class Order(BaseModel):
+    item: str
+    quantity: int
+
+
+def test_validate_body():
+    order, errors = validate_body(Order, JSON, b'{"item": "a", "quantity": 1}')
+    assert order == Order(item="a", quantity=1)
+    assert errors == []
+
+    order, errors = validate_body(Order, YAML, b"item: a\nquantity: x\n")
+    assert order is None
+    assert errors == [
+        {
+            "loc": ["quantity"],
+            "msg": "value is not a valid integer",
+            "type": "type_error.integer",
+        }
+    ]
+
+    order, errors = validate_body(Order, JSON, b"")
+    assert order is None
+    assert len(errors) == 1
+
+
+def test_body_models_for():
+    class Service(object):
+        post_model = Order
+        put_model = None
+
+    assert body_models_for(Service) == {"on_post": Order}
+
+    class InvalidService(object):
+        patch_model = dict
+
+    with pytest.raises(RuntimeError):
+        body_models_for(InvalidService)